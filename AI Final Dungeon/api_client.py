@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+
+# === Resilient API Client ===
+# Every OpenAI call from every worker thread goes through one shared
+# ResilientClient:
+#   - a token bucket caps the request rate (`burst` at once, `rate` per second)
+#   - 429s, 5xx and connection errors are retried with full-jitter
+#     exponential backoff, at least as long as any Retry-After
+#   - a call has a deadline covering all its attempts and waits, and each
+#     attempt's timeout is cut down to what is left of it
+#   - a circuit breaker opens after `failures` transient errors in a row;
+#     while it's open calls fail at once (and the game uses its local
+#     content) until a trial call gets through after `reset_after` seconds
+# The OpenAI client itself is built once, on first use, and keeps its HTTP
+# connections alive between calls.
+
+class CircuitOpen(Exception):
+    pass
+
+class DeadlineExceeded(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate  # <= 0 for no limit
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, timeout):
+        # Takes a token, waiting for it if need be; False (taking nothing) if
+        # that would be longer than timeout. Tokens are reserved up front, so
+        # waiting callers are served in order.
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if wait > timeout:
+                return False
+            self.tokens -= 1
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return True
+
+class CircuitBreaker:
+    def __init__(self, failures=5, reset_after=30.0):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False  # half-open: one call is testing the API
+        self.opens = 0
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        # Without claiming the trial call
+        with self.lock:
+            return self.opened_at is not None and (
+                self.trial or time.monotonic() - self.opened_at < self.reset_after)
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.reset_after:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        # True when this failure opened the circuit (or kept it open after a trial)
+        with self.lock:
+            self.failures += 1
+            if self.trial or (self.opened_at is None and self.failures >= self.threshold):
+                if not self.trial:
+                    self.opens += 1
+                self.opened_at = time.monotonic()
+                self.trial = False
+                return True
+            return False
+
+class ResilientClient:
+    def __init__(self, make_client, bucket, breaker, retries=4, base_delay=0.5, max_delay=8.0,
+                 deadline=20.0, attempt_timeout=10.0):
+        self.make_client = make_client
+        self.bucket = bucket
+        self.breaker = breaker
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline  # seconds per call, retries included
+        self.attempt_timeout = attempt_timeout
+        self.client = None
+        self.lock = threading.Lock()
+        self.rng = random.Random()  # keep the game's global RNG untouched
+        self.counts = {"calls": 0, "retries": 0, "failed": 0, "fast_failures": 0}
+
+    def get(self):
+        with self.lock:
+            if self.client is None:
+                self.client = self.make_client()
+        return self.client
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def backoff(self, attempt, error):
+        delay = self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, min(self.max_delay, retry_after(error) or 0.0))
+
+    def call(self, fn, on_retry=None):
+        # fn(client, timeout) makes one attempt. Raises CircuitOpen or
+        # DeadlineExceeded without trying, or the last attempt's error.
+        # on_retry(error, delay) is called before each retry.
+        self.count("calls")
+        deadline = time.monotonic() + self.deadline
+        client = self.get()
+        for attempt in range(self.retries + 1):
+            if self.breaker.is_open():
+                self.count("fast_failures")
+                raise CircuitOpen("the API is unavailable, using local content")
+            if not self.bucket.acquire(deadline - time.monotonic()):
+                self.count("failed")
+                raise DeadlineExceeded(f"no request slot within the {self.deadline:.0f}s deadline")
+            if not self.breaker.allow():
+                self.count("fast_failures")
+                raise CircuitOpen("the API is unavailable, using local content")
+
+            timeout = max(0.1, min(self.attempt_timeout, deadline - time.monotonic()))
+            try:
+                result = fn(client, timeout)
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.success()  # the API answered
+                    self.count("failed")
+                    raise
+                if self.breaker.failure():
+                    print(f"API circuit open for {self.breaker.reset_after:.0f}s after: {e}")
+                delay = self.backoff(attempt, e)
+                if attempt == self.retries or time.monotonic() + delay >= deadline:
+                    self.count("failed")
+                    raise
+                self.count("retries")
+                if on_retry is not None:
+                    on_retry(e, delay)
+                time.sleep(delay)
+                continue
+            self.breaker.success()
+            return result
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counts)
+        stats["circuit_opens"] = self.breaker.opens
+        stats["rate_wait"] = f"{self.bucket.waited:.1f}s"
+        return stats
+
+def is_transient(error):
+    # Worth retrying: rate limits (but not an exhausted quota), server
+    # errors, timeouts and dropped connections
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return (status == 429 and getattr(error, "code", None) != "insufficient_quota") or status >= 500
+    import openai  # already loaded once a request has been made
+    return isinstance(error, openai.APIConnectionError)
+
+def retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
@@ -0,0 +1,178 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+import pygame
+
+# === Packed Audio Bundle ===
+# Every sound and music track decoded once to PCM in the mixer's own format
+# and packed into one file, which is memory-mapped at startup. Sounds are
+# built straight from the mapped bytes and cached; music streams from the
+# mapping behind a WAV header, so restarts and deaths touch neither the
+# filesystem nor a codec. The bundle is rebuilt whenever a source file or
+# the mixer format changes, and missing sources are skipped (silently
+# unplayable) rather than fatal.
+#
+# Layout: MAGIC, header (version, frequency, format, channels, index
+# length), the JSON index, then the PCM data. Index offsets are relative to
+# the start of the data.
+
+MAGIC = b"DNGB"
+VERSION = 1
+HEADER = struct.Struct("<HIiHI")
+
+class MappedStream:
+    # A read-only file object over a WAV header plus a slice of the mapping,
+    # for pygame.mixer.music.load
+    def __init__(self, header, data):
+        self.header = header
+        self.data = data
+        self.size = len(header) + len(data)
+        self.pos = 0
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self.size, self.pos + size)
+        start, self.pos = self.pos, end
+        if start >= len(self.header):
+            return bytes(self.data[start - len(self.header):end - len(self.header)])
+        return self.header[start:end] + bytes(self.data[:max(0, end - len(self.header))])
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.pos, os.SEEK_END: self.size}[whence]
+        self.pos = max(0, min(self.size, base + offset))
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        pass
+
+# pygame.mixer.get_init() reports a sample size (-16 for signed 16-bit), not
+# an SDL format; pygame's only 32-bit mode is float, reported as -32. Older
+# pygames don't export the AUDIO_F32* constants, hence the fallback.
+SDL_FORMATS = {8: pygame.AUDIO_U8, -8: pygame.AUDIO_S8, 16: pygame.AUDIO_U16SYS, -16: pygame.AUDIO_S16SYS,
+               32: getattr(pygame, "AUDIO_F32SYS", 0x8120), -32: getattr(pygame, "AUDIO_F32SYS", 0x8120)}
+SDL_FLOAT = 0x100  # the data type bit of an SDL format
+
+def wav_header(frequency, fmt, channels, data_size):
+    bits = abs(fmt) & 0xFF
+    tag = 3 if SDL_FORMATS.get(fmt, 0) & SDL_FLOAT else 1  # IEEE float or integer PCM
+    block = channels * bits // 8
+    return (b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, tag, channels, frequency, frequency * block, block, bits)
+            + b"data" + struct.pack("<I", data_size))
+
+class AssetBank:
+    def __init__(self, path, sounds, music):
+        self.path = path
+        self.sounds = sounds  # name -> source file
+        self.music = music
+        self.entries = {}  # name -> memoryview of its PCM
+        self.cache = {}
+        self.mapping = None
+        self.format = None
+        self.lock = threading.Lock()
+        self.wanted_music = None  # asked for before the bank was loaded
+        self.playing = None
+
+    def sources(self):
+        stats = {}
+        for source in {**self.sounds, **self.music}.values():
+            if os.path.exists(source):
+                st = os.stat(source)
+                stats[source] = [st.st_size, st.st_mtime_ns]
+        return stats
+
+    def load(self):
+        # Maps the bundle, building it first when it's missing or stale.
+        # Safe to call from a background thread once the mixer is initialised;
+        # music asked for before then is started by poll(), not from here.
+        mixer_format = list(pygame.mixer.get_init())
+        index = self.read_index(mixer_format)
+        if index is None:
+            self.build(mixer_format)
+            index = self.read_index(mixer_format)
+
+        with open(self.path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(mapping)[index["data_start"]:]
+        with self.lock:
+            self.mapping = mapping
+            self.format = mixer_format
+            self.entries = {name: data[offset:offset + length] for name, (offset, length) in index["entries"].items()}
+
+    def poll(self):
+        # Once a frame, on the main thread (pygame's mixer isn't thread-safe):
+        # starts the music asked for before the bank was loaded
+        if self.wanted_music is None:
+            return
+        with self.lock:
+            if self.mapping is None:
+                return
+            wanted, self.wanted_music = self.wanted_music, None
+        if wanted:
+            self.play_music(*wanted)
+
+    def read_index(self, mixer_format):
+        try:
+            with open(self.path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    return None
+                version, frequency, fmt, channels, index_len = HEADER.unpack(f.read(HEADER.size))
+                index = json.loads(f.read(index_len))
+        except (OSError, ValueError, struct.error):
+            return None
+        if version != VERSION or [frequency, fmt, channels] != mixer_format or index["sources"] != self.sources():
+            return None
+        index["data_start"] = len(MAGIC) + HEADER.size + index_len
+        return index
+
+    def build(self, mixer_format):
+        sources = self.sources()
+        entries = {}
+        chunks = []
+        offset = 0
+        for name, source in {**self.sounds, **self.music}.items():
+            if source not in sources:
+                continue
+            pcm = pygame.mixer.Sound(source).get_raw()
+            entries[name] = [offset, len(pcm)]
+            chunks.append(pcm)
+            offset += len(pcm)
+
+        index = json.dumps({"sources": sources, "entries": entries}).encode("utf-8")
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + HEADER.pack(VERSION, *mixer_format, len(index)) + index)
+            for pcm in chunks:
+                f.write(pcm)
+        os.replace(tmp_path, self.path)
+
+    def sound(self, name):
+        # A cached Sound, or None if the bank isn't loaded or has no such asset
+        with self.lock:
+            cached = self.cache.get(name)
+            if cached is None and name in self.entries:
+                cached = self.cache[name] = pygame.mixer.Sound(buffer=self.entries[name])
+        return cached
+
+    def play_music(self, name, loops=-1):
+        with self.lock:
+            if self.mapping is None:
+                self.wanted_music = (name, loops)
+                return
+            data = self.entries.get(name)
+        pygame.mixer.music.stop()
+        if data is None:
+            return
+        self.playing = MappedStream(wav_header(self.format[0], self.format[1], self.format[2], len(data)), data)
+        pygame.mixer.music.load(self.playing, "wav")
+        pygame.mixer.music.play(loops)
+
+    def stop_music(self):
+        with self.lock:
+            self.wanted_music = None
+        pygame.mixer.music.stop()
@@ -0,0 +1,114 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from fake_openai import FakeConfig, start_server
+
+# === End-to-End Latency Benchmark ===
+# Plays the real game (prefetching, streaming, cache and all) against the
+# local fake OpenAI server with injected latency, driving it with scripted
+# key presses, and reports how long the player actually waits per room
+# advance and per combat turn:
+#
+#   python bench_latency.py --rooms 30 --latency lognormal:1.2,0.5 --think 1.0
+#
+# The game's own settings still come from the environment, so e.g.
+# prefetch_rooms=0 or batch_rooms=5 can be compared run against run.
+
+def drive(args, shared):
+    # Runs on a helper thread and posts input for the game running on the main thread
+    import pygame
+
+    while "main" not in sys.modules or not hasattr(sys.modules["main"], "start_menu"):
+        time.sleep(0.05)
+    game_module = shared["module"] = sys.modules["main"]
+    time.sleep(0.5)
+
+    def click(rect):
+        shared["mouse"] = rect.center
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=rect.center, button=1))
+
+    def press(key):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+
+    width, height = game_module.WIDTH, game_module.HEIGHT
+    click(pygame.Rect(width // 2 - 100, height // 2 - 50, 200, 50))  # Start Game
+
+    while len(game_module.perceived_waits["room"]) < args.rooms:
+        game = game_module.game
+        if game_module.loading_text:
+            time.sleep(0.005)
+            continue
+        time.sleep(args.think)  # the player reads before acting
+        if game.game_over:
+            click(game_module.RESTART_BTN_RECT)
+        elif game.post_boss_shop:
+            press(pygame.K_4)
+        elif game.in_combat:
+            press(pygame.K_s if game.special_ready() else pygame.K_a)
+        else:
+            press(pygame.K_SPACE)
+        time.sleep(0.02)  # let the main loop pick the key up
+
+    pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceived latency of the game against a fake OpenAI server.")
+    parser.add_argument("--rooms", type=int, default=20, help="room advances to measure")
+    parser.add_argument("--think", type=float, default=1.0, help="seconds the scripted player waits before each action")
+    parser.add_argument("--latency", default="lognormal:1.0,0.5", help="fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="latency for one model, e.g. gpt-4o=lognormal:2.0,0.4 (repeatable)")
+    parser.add_argument("--warm-cache", action="store_true", help="keep using gpt_cache.json and bestiary.json instead of cold ones")
+    parser.add_argument("--headless", action="store_true", help="use SDL's dummy video and audio drivers")
+    args = parser.parse_args()
+
+    config = FakeConfig(args.latency, args.token_delay, args.error_rate, args.malformed_rate, seed=args.seed,
+                        model_latency=dict(spec.split("=", 1) for spec in args.model_latency))
+    server, base_url = start_server(config)
+    os.environ["api_base_url"] = base_url
+    os.environ.setdefault("api_key", "fake")
+    scratch = tempfile.mkdtemp()
+    os.environ["save_path"] = os.path.join(scratch, "savegame.dat")  # never resume or clobber a real save
+    if not args.warm_cache:
+        os.environ.setdefault("bestiary_path", os.path.join(scratch, "bestiary.json"))
+        os.environ["cache_path"] = os.path.join(scratch, "gpt_cache.json")
+    if args.headless:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    import pygame
+    shared = {"mouse": (0, 0), "module": None}
+    pygame.mouse.get_pos = lambda: shared["mouse"]  # posted clicks don't move the real cursor
+
+    threading.Thread(target=drive, args=(args, shared), daemon=True).start()
+    start = time.perf_counter()
+    try:
+        import main  # noqa: F401 -- runs the game loop until the driver quits it
+    except SystemExit:
+        pass
+    game_module = shared["module"]
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(f"\nFake server: latency {args.latency}, token delay {args.token_delay}s, "
+          f"errors {args.error_rate:.0%}, malformed {args.malformed_rate:.0%}; think time {args.think}s; "
+          f"{elapsed:.1f}s wall")
+    for kind, waits in game_module.perceived_waits.items():
+        if not waits:
+            continue
+        stalled = sum(w > 0.1 for w in waits)
+        print(f"  per {kind:<4}: mean {sum(waits) / len(waits) * 1000:6.0f} ms, "
+              f"p50 {game_module.percentile(waits, 0.5) * 1000:6.0f} ms, "
+              f"p95 {game_module.percentile(waits, 0.95) * 1000:6.0f} ms, "
+              f"max {max(waits) * 1000:6.0f} ms, {stalled}/{len(waits)} over 100 ms")
+
+if __name__ == "__main__":
+    main()
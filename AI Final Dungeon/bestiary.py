@@ -0,0 +1,177 @@
+import json
+import os
+import random
+import threading
+
+from engine import Enemy, enemy_stat_ranges
+
+# === Bestiary ===
+# A persistent store of generated regular enemies, indexed by difficulty
+# tier (a band of TIER_ROOMS rooms, the last tier open-ended). Stats are
+# kept as positions within the tier's HP/ATK ranges and mapped onto the
+# exact room's ranges when drawn, so an entry always fits the room it lands
+# in.
+#
+# Each run draws without replacement: every tier keeps a list of the entry
+# indices still unused this run, and a draw swaps a random one to the end
+# and pops it, so it is O(1) however large the tier grows. Names are unique
+# across the whole bestiary, so duplicates are dropped on arrival for free
+# instead of costing a completion. When a tier runs low, refill(tier) is
+# called (once at a time per tier); it should generate more entries in the
+# background and hand them to finish_refill(), even if that's none.
+
+TIER_ROOMS = 5
+MAX_TIER = 5
+VERSION = 1
+
+class Bestiary:
+    def __init__(self, path, refill, low_water=4, rng=None):
+        self.path = path
+        self.refill = refill
+        self.low_water = low_water
+        self.rng = rng or random.Random()
+        self.entries = [[] for _ in range(MAX_TIER + 1)]  # [name, description, special, hp_pos, atk_pos]
+        self.names = set()
+        self.remaining = [[] for _ in range(MAX_TIER + 1)]  # unused entry indices this run
+        self.refilling = set()
+        self.draws = 0
+        self.empty_draws = 0
+        self.lock = threading.Lock()
+        self.load()
+        self.new_run()
+
+    # --- Tiers ---
+    @staticmethod
+    def tier(room_number):
+        return min(MAX_TIER, (room_number - 1) // TIER_ROOMS)
+
+    @staticmethod
+    def rooms(tier):
+        # First and last room a tier is generated for
+        first = tier * TIER_ROOMS + 1
+        return first, first + TIER_ROOMS - 1
+
+    @classmethod
+    def stat_ranges(cls, tier):
+        # (min_hp, max_hp, min_atk, max_atk) covering every room in the tier
+        first, last = cls.rooms(tier)
+        low, high = enemy_stat_ranges(first), enemy_stat_ranges(last)
+        return low[0], max(low[0], high[1]), low[2], max(low[2], high[3])
+
+    # --- Runs ---
+    def new_run(self, exclude=()):
+        # Every entry is available again, except names already met (on resume)
+        with self.lock:
+            for tier, entries in enumerate(self.entries):
+                self.remaining[tier] = [i for i, entry in enumerate(entries) if entry[0] not in exclude]
+
+    def draw(self, room_number):
+        # A fresh Enemy for this room not yet met this run, or None when the
+        # tier has run dry (a refill is then on its way)
+        tier = self.tier(room_number)
+        with self.lock:
+            self.draws += 1
+            pool = self.remaining[tier]
+            entry = None
+            if pool:
+                i = self.rng.randrange(len(pool))
+                pool[i], pool[-1] = pool[-1], pool[i]
+                entry = self.entries[tier][pool.pop()]
+            else:
+                self.empty_draws += 1
+            low = len(pool) < self.low_water and tier not in self.refilling
+            if low:
+                self.refilling.add(tier)
+        if low:
+            self.refill(tier)
+        return self.instantiate(entry, room_number) if entry else None
+
+    def instantiate(self, entry, room_number):
+        name, description, special, hp_pos, atk_pos = entry
+        min_hp, max_hp, min_atk, max_atk = enemy_stat_ranges(room_number)
+        return Enemy(
+            name=name,
+            description=description,
+            hp=min_hp + round(hp_pos * (max(min_hp, max_hp) - min_hp)),
+            atk=min_atk + round(atk_pos * (max(min_atk, max_atk) - min_atk)),
+            special=special
+        )
+
+    # --- Filling ---
+    def top_up(self, tiers=range(MAX_TIER + 1)):
+        # Asks for refills of any of these tiers that are running low
+        for tier in tiers:
+            with self.lock:
+                low = len(self.remaining[tier]) < self.low_water and tier not in self.refilling
+                if low:
+                    self.refilling.add(tier)
+            if low:
+                self.refill(tier)
+
+    def add(self, tier, enemies, used=False):
+        # Stores new enemies for a tier (Enemy objects, with stats inside
+        # stat_ranges(tier)); returns how many were new. used=True stores
+        # them without making them drawable this run (they were just met).
+        min_hp, max_hp, min_atk, max_atk = self.stat_ranges(tier)
+        added = 0
+        with self.lock:
+            for enemy in enemies:
+                if enemy.name in self.names:
+                    continue
+                self.names.add(enemy.name)
+                self.entries[tier].append([
+                    enemy.name, enemy.description, enemy.special,
+                    position(enemy.hp, min_hp, max_hp), position(enemy.atk, min_atk, max_atk)
+                ])
+                if not used:
+                    self.remaining[tier].append(len(self.entries[tier]) - 1)
+                added += 1
+            if added:
+                self.save()
+        return added
+
+    def finish_refill(self, tier, enemies):
+        added = self.add(tier, enemies)
+        with self.lock:
+            self.refilling.discard(tier)
+        return added
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": [len(entries) for entries in self.entries],
+                "unused_this_run": [len(pool) for pool in self.remaining],
+                "draws": self.draws,
+                "empty_draws": self.empty_draws,
+            }
+
+    # --- Persistence ---
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != VERSION:
+            return
+        for tier, entries in enumerate(data.get("tiers", [])[:MAX_TIER + 1]):
+            for entry in entries:
+                if entry[0] not in self.names:
+                    self.names.add(entry[0])
+                    self.entries[tier].append(entry)
+
+    def save(self):
+        # Called with the lock held
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": VERSION, "tiers": self.entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print("Could not save the bestiary:", e)
+
+def position(value, low, high):
+    # Where value sits in [low, high], from 0.0 to 1.0
+    if high <= low:
+        return 0.5
+    return max(0.0, min(1.0, (value - low) / (high - low)))
@@ -0,0 +1,78 @@
+# === Combat Log ===
+# The lines under the room description, in a fixed-capacity ring buffer: a
+# long session never holds more than `capacity` of them, and appending past
+# that overwrites the oldest in place. Lines are str, None (skipped when
+# shown) or anything whose str() grows in place, like a StreamBuffer that
+# is still streaming in.
+#
+# tail(n) is the last n lines joined for drawing. It's cached until the log
+# changes or a streamed line in it grows, so an unchanged log allocates
+# nothing per frame, and the same str object keeps hitting the layout cache.
+
+LOG_CAPACITY = 64
+
+class CombatLog:
+    def __init__(self, lines=(), capacity=LOG_CAPACITY):
+        self.capacity = capacity
+        self.slots = []  # grows to capacity, then wraps around at start
+        self.start = 0
+        self.version = 0
+        self.streamed = 0  # lines that aren't plain str or None
+        self.views = {}  # n -> (version, stream_length, text)
+        for line in lines:
+            self.append(line)
+
+    def append(self, line):
+        if len(self.slots) < self.capacity:
+            self.slots.append(line)
+        else:
+            if is_streamed(self.slots[self.start]):
+                self.streamed -= 1
+            self.slots[self.start] = line
+            self.start = (self.start + 1) % self.capacity
+        if is_streamed(line):
+            self.streamed += 1
+        self.version += 1
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __iter__(self):
+        size = len(self.slots)
+        for i in range(size):
+            yield self.slots[(self.start + i) % size]
+
+    def __getitem__(self, index):
+        size = len(self.slots)
+        if not -size <= index < size:
+            raise IndexError("combat log index out of range")
+        return self.slots[(self.start + index % size) % size]
+
+    def last(self, n):
+        size = len(self.slots)
+        for i in range(max(0, size - n), size):
+            yield self.slots[(self.start + i) % size]
+
+    def stream_length(self, n):
+        # Changes whenever a streamed line among the last n grows
+        length = 0
+        for line in self.last(n):
+            if is_streamed(line):
+                length += len(str(line))
+        return length
+
+    def tail(self, n):
+        length = self.stream_length(n) if self.streamed else 0
+        cached = self.views.get(n)
+        if cached is not None and cached[0] == self.version and cached[1] == length:
+            return cached[2]
+        text = "\n".join(str(line) for line in self.last(n) if line is not None)
+        self.views[n] = (self.version, length, text)
+        return text
+
+def is_streamed(line):
+    return line is not None and not isinstance(line, str)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import random
+import threading
+from collections import OrderedDict
+
+# === Persistent GPT Content Cache ===
+# Responses are stored on disk, keyed by (normalized prompt, model, temperature).
+# Each key keeps up to `variants` different responses: until a key has that
+# many, lookups count as misses so the caller asks GPT for a fresh one; after
+# that a random stored variant comes back. Keys are evicted least recently
+# used once there are more than `max_entries`.
+#
+# Writes only mark the cache dirty; a background thread saves it every
+# `flush_interval` seconds (see start_flusher) and close() saves what's left,
+# so a request thread never pays for rewriting the whole file.
+class ContentCache:
+    def __init__(self, path, max_entries=500, variants=3):
+        self.path = path
+        self.max_entries = max_entries
+        self.variants = variants
+        self.entries = OrderedDict()  # key -> [response, ...]
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # one file write at a time
+        self.dirty = False
+        self.stop = threading.Event()
+        self.rng = random.Random()  # keep the game's global RNG untouched
+        self.load()
+
+    @staticmethod
+    def make_key(prompt, model, temperature):
+        normalized = " ".join(prompt.split())
+        raw = json.dumps([normalized, model, round(temperature, 2)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, prompt, model, temperature):
+        key = self.make_key(prompt, model, temperature)
+        with self.lock:
+            stored = self.entries.get(key)
+            if not stored or len(stored) < self.variants:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.rng.choice(stored)
+
+    def put(self, prompt, model, temperature, response):
+        key = self.make_key(prompt, model, temperature)
+        with self.lock:
+            stored = self.entries.setdefault(key, [])
+            stored.append(response)
+            del stored[:-self.variants]
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.dirty = True
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # The file is written oldest-first, so order doubles as recency
+        for key, stored in data.get("entries", []):
+            self.entries[key] = stored[-self.variants:]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        # Only when something changed. The entries are copied under the lock and
+        # written outside it, to a temp file swapped in so a crash never leaves
+        # half a cache.
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                entries = [(key, list(stored)) for key, stored in self.entries.items()]
+                self.dirty = False
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": entries}, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print("Could not save GPT cache:", e)
+                with self.lock:
+                    self.dirty = True  # try again next flush
+
+    def start_flusher(self, interval=5.0):
+        def run():
+            while not self.stop.wait(interval):
+                self.save()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def close(self):
+        self.stop.set()
+        self.save()
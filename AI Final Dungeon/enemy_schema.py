@@ -0,0 +1,163 @@
+import json
+import re
+
+from engine import Enemy
+
+# === Enemy JSON ===
+# The schema enemy and boss replies are generated against, a parser that
+# repairs the near misses models still produce (code fences, chatter around
+# the object, trailing commas, a reply cut off by max_tokens), and the
+# conversion to an Enemy with stats clamped to the room's ranges. A reply
+# only needs asking for again when nothing usable can be recovered from it.
+
+SPECIAL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "effect": {"type": "string", "enum": ["burn", "freeze"]},
+        "description": {"type": "string"},
+    },
+    "required": ["name", "effect", "description"],
+    "additionalProperties": False,
+}
+
+ENEMY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+        "hp": {"type": "integer"},
+        "atk": {"type": "integer"},
+        "special": {"anyOf": [SPECIAL_SCHEMA, {"type": "null"}]},
+    },
+    "required": ["name", "description", "hp", "atk", "special"],
+    "additionalProperties": False,
+}
+
+def response_format(name, schema):
+    # Structured-output request for chat.completions.create
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+ENEMY_FORMAT = response_format("enemy", ENEMY_SCHEMA)
+
+BESTIARY_SCHEMA = {
+    "type": "object",
+    "properties": {"enemies": {"type": "array", "items": ENEMY_SCHEMA}},
+    "required": ["enemies"],
+    "additionalProperties": False,
+}
+BESTIARY_FORMAT = response_format("bestiary", BESTIARY_SCHEMA)
+
+# === Tolerant Parsing ===
+FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+DANGLING = re.compile(r'(,\s*"[^"\\]*"\s*:?\s*|,\s*|:\s*)$')
+
+def scan(text, start=0):
+    # Walks brackets outside strings. Returns (end, open_closers, in_string):
+    # end is just past the bracket closing the first one, or None if the
+    # text stops first (or a bracket doesn't match)
+    closers = []
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            closers.append("}" if c == "{" else "]")
+        elif c in "}]":
+            if not closers or closers.pop() != c:
+                return None, [], False
+            if not closers:
+                return i + 1, [], False
+    return None, closers, in_string
+
+def close_truncated(fragment):
+    # Finishes a reply that stopped mid-object: end the open string, drop a
+    # dangling key or comma, close every open bracket
+    _, closers, in_string = scan(fragment)
+    if in_string:
+        fragment += '"'
+    fragment = DANGLING.sub("", fragment)
+    return fragment + "".join(reversed(closers))
+
+def parse_lenient(text):
+    # The first JSON object or array in text, repaired if need be; None if
+    # nothing parses
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+
+    end, _, _ = scan(text, start)
+    if end is not None:
+        candidates = [text[start:end]]
+    else:
+        # Truncated: close it where it stopped, then at each of the last few
+        # commas in case the last member is too broken to keep
+        body = text[start:]
+        candidates = [close_truncated(body)]
+        cut = len(body)
+        for _ in range(3):
+            cut = body.rfind(",", 0, cut)
+            if cut <= 0:
+                break
+            candidates.append(close_truncated(body[:cut]))
+
+    for candidate in candidates:
+        for attempt in (candidate, TRAILING_COMMA.sub(r"\1", candidate)):
+            try:
+                return json.loads(attempt)
+            except ValueError:
+                continue
+    return None
+
+# === Validation ===
+def clamp(value, low, high):
+    return max(low, min(max(low, high), value))
+
+def stat(data, key, low, high):
+    # The clamped stat, or the middle of the range when it's missing or not
+    # a number (usually a reply cut off right before it)
+    try:
+        return clamp(int(data[key]), low, high)
+    except (KeyError, TypeError, ValueError):
+        return (low + max(low, high)) // 2
+
+def enemy_from_data(data, stat_ranges, is_boss=False):
+    # An Enemy from parsed JSON with stats inside stat_ranges
+    # (min_hp, max_hp, min_atk, max_atk); None without a name, the one
+    # thing that can't be made up locally. A special with an unknown effect
+    # is dropped.
+    if not isinstance(data, dict) or not str(data.get("name") or "").strip():
+        return None
+
+    special = data.get("special")
+    if not (isinstance(special, dict) and special.get("effect") in ("burn", "freeze")):
+        special = None
+    min_hp, max_hp, min_atk, max_atk = stat_ranges
+    return Enemy(
+        name=str(data["name"]).strip(),
+        description=str(data.get("description") or "").strip(),
+        hp=stat(data, "hp", min_hp, max_hp),
+        atk=stat(data, "atk", min_atk, max_atk),
+        special=special,
+        is_boss=is_boss
+    )
@@ -0,0 +1,588 @@
+import random
+from functools import lru_cache
+
+from combat_log import CombatLog
+
+# === Headless Game Engine ===
+# All of the game rules, with no pygame, audio or network. Randomness comes
+# from an injected RNG (anything with random()/randint()/choice(), the random
+# module by default), narration from an injected content source, and sounds
+# are reported through a notify(event) callback ("block", "damage",
+# "purchase") for the front end to play.
+
+# === Difficulty Scaling ===
+def enemy_stat_ranges(room_count):
+    # Scale difficulty based on room count
+    min_hp = 20 + room_count * 2
+    max_hp = min(70, 30 + room_count * 4)
+    min_atk = 5 + room_count // 2
+    max_atk = min(25, 10 + room_count * 2)
+    return min_hp, max_hp, min_atk, max_atk
+
+def boss_stat_ranges(room_count):
+    min_hp = 100 + room_count * 3
+    max_hp = 200 + room_count * 4
+    min_atk = 15 + room_count // 2
+    max_atk = 20 + room_count
+    return min_hp, max_hp, min_atk, max_atk
+
+# === Status Effects ===
+# Every effect is one row of EFFECTS, and every combatant keeps one turn
+# count per row (0 = not affected), so a tick is a single pass over a short
+# list, and a new effect is one more row. Combatants with nothing active
+# share the NO_EFFECTS tuple, so making one allocates nothing and ticking it
+# is an identity check; the first effect gives it a list of its own.
+#
+# The player's effects all tick at the start of its turn (damage, a line,
+# one turn less, then the wear-off lines); if a skipping effect is still on
+# after that, the turn is lost. An enemy's turn is taken whole by a
+# skipping effect, which counts down alone; otherwise it attacks and then
+# its damaging effects tick, without wear-off lines. Messages are (for the
+# player, for an enemy) pairs, filled in up front except for the enemy's
+# name, which goes through a small cache of rendered lines.
+WEAR_OFF = "The {effect} effect wears off."
+FROZEN = "You're frozen and skip this turn!"
+
+class Effect:
+    __slots__ = ("name", "turns", "damage", "skips", "tick", "wear_off", "cast")
+
+    def __init__(self, name, turns, damage=0, skips=False, tick=(None, None), cast=(None, None)):
+        self.name = name
+        self.turns = turns  # when inflicted
+        self.damage = damage  # per turn
+        self.skips = skips
+        self.tick = tuple(line.format(name="{name}", damage=damage) for line in tick)  # every turn it's active
+        self.wear_off = WEAR_OFF.format(effect=name)  # the player's only
+        self.cast = cast  # when it lands; on an enemy, with the damage of the player's special
+
+EFFECTS = (
+    Effect("burn", turns=3, damage=5,
+           tick=("You are burning! (-{damage} HP)", "{name} is burning! (-{damage} HP)"),
+           cast=("{name} scorches you! You are burning!",
+                 "You unleash a fire blast! The {name} takes {damage} damage and is burning!")),
+    Effect("freeze", turns=2, skips=True,
+           tick=("You are frozen and might skip your action!", "{name} is frozen and skips its turn!"),
+           cast=("{name} freezes you solid!",
+                 "You freeze the enemy! The {name} takes {damage} damage and may skip actions!")),
+)
+EFFECT_INDEX = {effect.name: i for i, effect in enumerate(EFFECTS)}
+NO_EFFECTS = (0,) * len(EFFECTS)
+
+@lru_cache(maxsize=1024)
+def render(line, name):
+    return line.format(name=name)
+
+def tick_player(player):
+    # The start of the player's turn: (messages, skips_turn)
+    effects = player.effects
+    if effects is NO_EFFECTS:
+        return [], False
+    msgs = []
+    worn = []
+    skips = False
+    for i, turns in enumerate(effects):
+        if turns:
+            effect = EFFECTS[i]
+            player.hp -= effect.damage
+            msgs.append(effect.tick[0])
+            effects[i] = turns - 1
+            if turns == 1:
+                worn.append(effect.wear_off)
+            elif effect.skips:
+                skips = True
+    if worn and not any(effects):
+        player.effects = NO_EFFECTS
+    return msgs + worn, skips
+
+def skip_turn(enemy):
+    # The enemy's line if a skipping effect takes its turn, else None
+    effects = enemy.effects
+    if effects is NO_EFFECTS:
+        return None
+    msgs = []
+    for i, turns in enumerate(effects):
+        if turns and EFFECTS[i].skips:
+            effects[i] = turns - 1
+            msgs.append(render(EFFECTS[i].tick[1], enemy.name))
+    if msgs and not any(effects):
+        enemy.effects = NO_EFFECTS
+    return "\n".join(msgs) if msgs else None
+
+def tick_damage(enemy):
+    # The enemy's damaging effects, after its attack: their lines
+    effects = enemy.effects
+    if effects is NO_EFFECTS:
+        return []
+    msgs = []
+    for i, turns in enumerate(effects):
+        if turns and not EFFECTS[i].skips:
+            enemy.hp -= EFFECTS[i].damage
+            effects[i] = turns - 1
+            msgs.append(render(EFFECTS[i].tick[1], enemy.name))
+    if msgs and not any(effects):
+        enemy.effects = NO_EFFECTS
+    return msgs
+
+# === Game Classes ===
+# Slotted, so the many enemies of a batch simulation carry no __dict__
+class Combatant:
+    __slots__ = ("hp", "effects")
+    side = None  # index into an effect's message pairs
+
+    def inflict(self, name):
+        if self.effects is NO_EFFECTS:
+            self.effects = list(NO_EFFECTS)
+        i = EFFECT_INDEX[name]
+        self.effects[i] = EFFECTS[i].turns
+
+    @property
+    def status_effects(self):
+        # {name: turns left}, e.g. for saves
+        return {EFFECTS[i].name: turns for i, turns in enumerate(self.effects) if turns}
+
+    @status_effects.setter
+    def status_effects(self, counts):
+        effects = list(NO_EFFECTS)
+        for name, turns in counts.items():
+            if name in EFFECT_INDEX:  # an effect since removed is dropped
+                effects[EFFECT_INDEX[name]] = turns
+        self.effects = effects if any(effects) else NO_EFFECTS
+
+class Player(Combatant):
+    __slots__ = ("inventory", "gold", "blocks_remaining", "atk_bonus", "notify")
+    side = 0
+
+    def __init__(self, hp=100, notify=None):
+        self.hp = hp
+        self.effects = NO_EFFECTS
+        self.inventory = {}
+        self.gold = 50
+        self.blocks_remaining = 0
+        self.atk_bonus = 0
+        self.notify = notify or (lambda event: None)
+
+    def attack(self, enemy, rng=random):
+        base_damage = rng.randint(5, 15)
+        total_damage = base_damage + self.atk_bonus
+        enemy.hp -= total_damage
+        return f"You hit the {enemy.name} for {total_damage} damage!"
+
+    def heal(self, amount):
+        self.hp += amount
+        return f"You healed for {amount} HP."
+
+    def take_damage(self, damage):
+        if self.blocks_remaining > 0:
+            self.blocks_remaining -= 1
+            self.notify("block")
+            return f"You blocked the attack! ({self.blocks_remaining} blocks left)"
+        else:
+            self.hp -= damage
+            self.notify("damage")
+            return f"You took {damage} damage!"
+
+    def buy(self, item, cost):
+        if self.gold >= cost:
+            self.gold -= cost
+            self.notify("purchase")
+
+            if item == "Attack Buff":
+                self.atk_bonus += 5
+                return f"You bought {item} for {cost} gold. Attack +5!"
+
+            self.inventory[item] = self.inventory.get(item, 0) + 1
+            return f"You bought {item} for {cost} gold."
+        else:
+            return "Not enough gold."
+
+    def special_attack(self, enemy, effect="burn", rng=random):
+        base_damage = rng.randint(8, 18)
+        total_damage = base_damage + self.atk_bonus
+        enemy.hp -= total_damage
+        if effect not in EFFECT_INDEX:
+            return f"You use a mysterious force! The {enemy.name} takes {total_damage} damage."
+        enemy.inflict(effect)
+        return EFFECTS[EFFECT_INDEX[effect]].cast[enemy.side].format(name=enemy.name, damage=total_damage)
+
+class Enemy(Combatant):
+    __slots__ = ("name", "description", "atk", "is_boss", "special", "last_damage")
+    side = 1
+
+    def __init__(self, name, description, hp, atk, special=None, is_boss=False):
+        self.hp = hp
+        self.effects = NO_EFFECTS
+        self.name = name
+        self.description = description
+        self.atk = atk
+        self.is_boss = is_boss
+        self.special = special
+        self.last_damage = None  # damage rolled on the last attack, None if it skipped
+
+    def attack(self, player, rng=random):
+        self.last_damage = None
+        affected = self.effects is not NO_EFFECTS
+        if affected:
+            skipped = skip_turn(self)
+            if skipped:
+                return skipped
+
+        damage = rng.randint(1, self.atk)
+        self.last_damage = damage
+        log = [player.take_damage(damage)]
+        if affected:
+            log.extend(tick_damage(self))
+
+        # Attempt special attack (burn/freeze)
+        if self.special and rng.random() < 0.4:  # 40% chance to use special
+            effect = self.special.get("effect")
+            if effect in EFFECT_INDEX:
+                player.inflict(effect)
+                default = EFFECTS[EFFECT_INDEX[effect]].cast[player.side].format(name=self.name)
+                log.append(self.special.get("description", default))
+
+        return "\n".join(log)
+
+# === Rules ===
+def loot_drop(player, rng=random):
+    if rng.random() < 0.5:
+        loot = rng.choice(["Healing Potion", "Mysterious Pill", "Shield"])
+        player.inventory[loot] = player.inventory.get(loot, 0) + 1
+        return f"You found a {loot}!"
+    else:
+        gold_found = rng.randint(5, 30)
+        player.gold += gold_found
+        return f"You found {gold_found} gold coins!"
+
+def random_event(player, rng=random):
+    event = rng.choice(["trap", "blessing"])
+    if event == "trap":
+        damage = rng.randint(5, 15)
+        return player.take_damage(damage) + "\n A hidden trap springs!"
+    else:
+        heal = rng.randint(5, 15)
+        return player.heal(heal) + "\n A magical aura surrounds you."
+
+# === Shop System ===
+shop_items = [
+    {"name": "Healing Potion", "cost": 10},
+    {"name": "Attack Buff", "cost": 25},
+    {"name": "Mysterious Pill", "cost": 15},
+    {"name": "Shield", "cost": 20}
+]
+
+item_descriptions = {
+    "Healing Potion": "Restores 20 HP",
+    "Attack Buff": "+5 ATK",
+    "Mysterious Pill": "???",
+    "Shield": "Grants 2 temporary blocks from damage"
+}
+
+def enter_shop(player):
+    items = []
+    for i, item in enumerate(shop_items):
+        name = item['name']
+        cost = item['cost']
+        desc = item_descriptions.get(name, "A mysterious item.")
+        label = f"[{i+1}] {name} - {cost} gold"
+        items.append((label, desc))
+
+    return items
+
+def enter_hp_shop(player):
+    return [
+        ("[1] Cursed Blade", "Trade 10 HP for +10 ATK"),
+        ("[2] Soul Shield", "Trade 8 HP for +4 blocks"),
+        ("[3] Blood Elixir", "Trade 15 HP for +40 HP"),
+        ("[4] Leave", "Walk away")
+    ]
+
+# === Item usage ===
+def use_item(player, item_name, rng=random, content=None):
+    if player.inventory.get(item_name, 0) == 0:
+        return f"You have no {item_name} to use."
+
+    # Reduce count
+    player.inventory[item_name] -= 1
+    if player.inventory[item_name] <= 0:
+        del player.inventory[item_name]
+
+    if item_name == "Healing Potion":
+        heal_amount = 20
+        player.hp += heal_amount
+        return f"You use a Healing Potion and heal {heal_amount} HP."
+
+    elif item_name == "Mysterious Pill":
+        result = rng.choice(["good", "bad"])
+        effect = rng.choice(["hp", "atk", "block"])
+
+        # Apply effect
+        if result == "good":
+            if effect == "hp":
+                amount = rng.randint(10, 20)
+                player.hp += amount
+            elif effect == "atk":
+                player.atk_bonus += 5
+            elif effect == "block":
+                player.blocks_remaining += 2
+        else:  # bad outcome
+            if effect == "hp":
+                amount = rng.randint(5, 15)
+                player.hp -= amount
+            elif effect == "atk" and player.atk_bonus > 0:
+                player.atk_bonus -= 5
+            elif effect == "block" and player.blocks_remaining > 0:
+                player.blocks_remaining -= 1
+
+        # The flavor text comes from the content source, possibly later
+        narration = content.pill_effect(result == "good", effect) if content else None
+        return f"You swallow the Mysterious Pill...\n{narration or 'Something strange happens.'}"
+
+    elif item_name == "Shield":
+        player.blocks_remaining += 2  # Stackable shield blocks
+        return f" You equip a Shield. Total blocks: {player.blocks_remaining}"
+    else:
+        return f"You try to use {item_name}, but nothing happens."
+
+# === Local Content ===
+# Offline stand-in for GPT: rooms, enemies and bosses rolled from the RNG
+# inside the same difficulty ranges. Narration hooks return None, which the
+# rules treat the same as a failed GPT call.
+ENEMY_NAMES = ["Goblin", "Skeleton", "Cave Troll", "Giant Rat", "Cultist", "Slime", "Ghoul", "Bandit"]
+BOSS_NAMES = ["Flame Wraith", "Bone Colossus", "Hollow King", "Frost Hydra"]
+ROOM_TEXTS = [
+    "A damp stone chamber lit by guttering torches.",
+    "A collapsed library that smells of mould and old ink.",
+    "A narrow hall where water drips into unseen pools.",
+    "A vaulted crypt, silent but for the rattle of chains.",
+]
+
+class LocalContent:
+    def __init__(self, rng=random):
+        self.rng = rng
+
+    def quest(self):
+        return "Reach the deepest room and return alive."
+
+    def room_text(self, room_number):
+        return self.rng.choice(ROOM_TEXTS)
+
+    def roll_special(self):
+        if self.rng.random() < 0.3:
+            effect = self.rng.choice(["burn", "freeze"])
+            return {"name": effect.title(), "effect": effect, "description": f"The enemy's {effect} attack hits you!"}
+        return None
+
+    def enemy(self, room_number):
+        min_hp, max_hp, min_atk, max_atk = enemy_stat_ranges(room_number)
+        return Enemy(
+            name=self.rng.choice(ENEMY_NAMES),
+            description="A creature of the dungeon.",
+            hp=self.rng.randint(min_hp, max(min_hp, max_hp)),
+            atk=self.rng.randint(min_atk, max(min_atk, max_atk)),
+            special=self.roll_special()
+        )
+
+    def boss(self, room_number):
+        min_hp, max_hp, min_atk, max_atk = boss_stat_ranges(room_number)
+        effect = self.rng.choice(["burn", "freeze"])
+        return Enemy(
+            name=self.rng.choice(BOSS_NAMES),
+            description="A towering master of the deep.",
+            hp=self.rng.randint(min_hp, max_hp),
+            atk=self.rng.randint(min_atk, max_atk),
+            special={"name": effect.title(), "effect": effect, "description": f"The boss's {effect} engulfs you!"},
+            is_boss=True
+        )
+
+    def boss_attack(self, enemy, damage):
+        return None
+
+    def pill_effect(self, good, effect):
+        return None
+
+    def death(self, room_number):
+        return None
+
+# === Game State Machine ===
+# One run of the dungeon. The front end (or a simulation) drives it with
+# these methods; content for new rooms is fetched outside so it can be
+# generated ahead of time or asynchronously.
+class Game:
+    def __init__(self, rng=random, content=None, notify=None):
+        self.rng = rng
+        self.content = content if content is not None else LocalContent(rng)
+        self.notify = notify
+        self.reset()
+
+    def reset(self):
+        self.player = Player(notify=self.notify)
+        self.enemy = None
+        self.combat_log = []
+        self.room_count = 1
+        self.room_text = None
+        self.special_attack_last_used_room = -4
+        self.game_over = False
+        self.in_combat = False
+        self.post_boss_shop = False
+
+    @property
+    def combat_log(self):
+        return self.log
+
+    @combat_log.setter
+    def combat_log(self, lines):
+        # The rules replace the log wholesale with a list; a CombatLog (e.g.
+        # one kept aside while an overlay covered it) is taken as is
+        self.log = lines if isinstance(lines, CombatLog) else CombatLog(lines)
+
+    def start(self, room_text, quest_text):
+        self.room_text = room_text
+        self.combat_log = [" Quest: " + (quest_text or "Survive the dungeon.")]
+
+    # --- Rooms ---
+    def roll_room(self, room_number):
+        # Everything random about a room, decided before its content exists:
+        # (golden, is_boss, spawn)
+        if self.rng.random() < 0.1:
+            return True, False, False
+        is_boss = room_number % 10 == 0
+        spawn = is_boss or self.rng.random() < 0.7
+        return False, is_boss, spawn
+
+    def enter_room(self, golden, room_text=None, enemy=None):
+        if golden:
+            self.room_text = "You find a Golden Room! The walls gleam with treasure!"
+            self.player.gold += 50
+            self.combat_log = ["You found a hidden cache and gained 50 gold!"]
+            return
+
+        self.room_text = room_text
+        if enemy is not None:
+            self.enemy = enemy
+            if enemy.is_boss:
+                self.combat_log = [f"⚔️ BOSS ENCOUNTER: {enemy.name} ⚔️",
+                                   f"{enemy.description} (HP: {enemy.hp}, ATK: {enemy.atk})"]
+            else:
+                self.combat_log = [f"You encounter: {enemy.name}",
+                                   f"{enemy.description} (HP: {enemy.hp}, ATK: {enemy.atk})"]
+            self.in_combat = True
+        else:
+            self.combat_log = [random_event(self.player, self.rng)]
+
+    def advance(self):
+        # Synchronous room advance straight from the content source
+        self.room_count += 1
+        golden, is_boss, spawn = self.roll_room(self.room_count)
+        if golden:
+            self.enter_room(True)
+            return
+        room_text = self.content.room_text(self.room_count)
+        if is_boss:
+            enemy = self.content.boss(self.room_count)
+        elif spawn:
+            enemy = self.content.enemy(self.room_count)
+        else:
+            enemy = None
+        self.enter_room(False, room_text, enemy)
+
+    # --- Combat ---
+    def special_ready(self):
+        return self.room_count - self.special_attack_last_used_room >= 4
+
+    def combat_turn(self, action):
+        # action is "attack" or "special"
+        status_msgs, frozen = tick_player(self.player)
+
+        if frozen:
+            self.combat_log = status_msgs + [FROZEN]
+            return
+
+        if action == "attack":
+            self.combat_log = status_msgs + [self.player.attack(self.enemy, self.rng)]
+        elif action == "special":
+            if self.special_ready():
+                effect = self.rng.choice(["burn", "freeze"])
+                self.combat_log = status_msgs + [self.player.special_attack(self.enemy, effect, self.rng)]
+                self.special_attack_last_used_room = self.room_count
+            else:
+                turns_left = 4 - (self.room_count - self.special_attack_last_used_room)
+                self.combat_log = status_msgs + [f"Special attack not ready! {turns_left} more room(s) needed "]
+
+        if self.enemy.hp > 0:
+            self.enemy_turn()
+        else:
+            self.enemy_defeated()
+
+    def enemy_turn(self):
+        # An enemy its burn finishes off falls on the player's next turn
+        enemy = self.enemy
+        self.combat_log.append(enemy.attack(self.player, self.rng))
+        if enemy.is_boss and enemy.last_damage is not None:
+            narration = self.content.boss_attack(enemy, enemy.last_damage)
+            if narration:
+                self.combat_log.append(narration)
+
+    def enemy_defeated(self):
+        self.combat_log.append(loot_drop(self.player, self.rng))
+        if self.enemy.is_boss:
+            self.post_boss_shop = True
+            self.combat_log = ["A shadowy shopkeeper appears...", "Trade your health for power."]
+        self.in_combat = False
+
+    def run_away(self):
+        # Try to run from combat with 50% success chance
+        if self.rng.random() < 0.5:
+            self.combat_log.append("You successfully ran away!")
+            self.in_combat = False
+        else:
+            self.combat_log.append("You failed to escape!")
+            self.enemy_turn()
+
+    # --- Shops and items ---
+    def buy(self, index):
+        if 0 <= index < len(shop_items):
+            item = shop_items[index]
+            return self.player.buy(item['name'], item['cost'])
+        return None
+
+    def use_item(self, item_name):
+        return use_item(self.player, item_name, self.rng, self.content)
+
+    def hp_shop(self, choice):
+        # choice 1-3 buys an artifact, 4 walks away
+        player = self.player
+        if choice == 1:
+            if player.hp > 10:
+                player.hp -= 10
+                player.atk_bonus += 10
+                self.combat_log = ["You grasp the Cursed Blade. Power surges through your veins."]
+            else:
+                self.combat_log = ["You don't have enough HP for the Cursed Blade."]
+        elif choice == 2:
+            if player.hp > 8:
+                player.hp -= 8
+                player.blocks_remaining += 4
+                self.combat_log = ["The Soul Shield binds to your aura. You feel protected."]
+            else:
+                self.combat_log = ["Not enough HP for the Soul Shield."]
+        elif choice == 3:
+            if player.hp > 15:
+                player.hp -= 15
+                player.hp += 40
+                self.combat_log = ["You drink the Blood Elixir. It burns... then heals."]
+            else:
+                self.combat_log = ["Too little HP to survive the Blood Elixir."]
+        else:
+            self.combat_log = ["You nod to the shopkeeper and walk on."]
+        self.post_boss_shop = False
+
+    def check_death(self):
+        # True the moment the player dies
+        if self.player.hp > 0 or self.game_over:
+            return False
+        self.game_over = True
+        self.combat_log.append("Game over...")
+        narration = self.content.death(self.room_count)
+        if narration:
+            self.combat_log.append(narration)
+        return True
@@ -0,0 +1,304 @@
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine import enemy_stat_ranges, boss_stat_ranges
+
+# === Local Fake OpenAI Server ===
+# A stand-in for the chat-completions and images endpoints, for benchmarks
+# and offline play. Replies are templated from the prompt, so enemy and boss
+# JSON is valid for generate_enemy/generate_boss and inside the room's stat
+# ranges. Latency, error and malformed-JSON rates are configurable.
+#
+#   python fake_openai.py --port 8765 --latency lognormal:0.8,0.4 --error-rate 0.05
+#
+# then point the game at it in .env:  api_base_url=http://127.0.0.1:8765/v1
+
+class FakeConfig:
+    def __init__(self, latency="fixed:0", token_delay=0.0, error_rate=0.0, malformed_rate=0.0,
+                 image_size=256, seed=None, model_latency=None):
+        self.latency = parse_latency(latency)
+        # per-model overrides, e.g. {"gpt-4o": "lognormal:2.0,0.4"}
+        self.model_latency = {model: parse_latency(spec) for model, spec in (model_latency or {}).items()}
+        self.token_delay = token_delay  # seconds between streamed chunks
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.image_size = image_size
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self):
+        with self.lock:
+            return self.rng.random()
+
+    def delay(self, model=None):
+        with self.lock:
+            return self.model_latency.get(model, self.latency)(self.rng)
+
+def parse_latency(spec):
+    # "fixed:S", "uniform:LO,HI" or "lognormal:MEDIAN,SIGMA", all in seconds
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return lambda rng: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+# === Canned Content ===
+ADJECTIVES = ["Rotting", "Hollow", "Ashen", "Feral", "Gloom", "Iron", "Blighted", "Frost", "Ember", "Venom",
+              "Grave", "Shade", "Bone", "Howling", "Rust", "Cinder", "Pale", "Thorn", "Storm", "Crypt"]
+NOUNS = ["Ghoul", "Rat", "Knight", "Wisp", "Spider", "Troll", "Cultist", "Hound", "Golem", "Bat",
+         "Wraith", "Serpent", "Imp", "Slime", "Archer", "Warden", "Mauler", "Shaman", "Crawler", "Fiend"]
+ROOM_LINES = [
+    "Torchlight gutters across wet stone, and the air tastes of rust and old smoke.",
+    "A low hum fills the vaulted chamber while mould creeps along cracked pillars.",
+    "Chains sway in a cold draught, and somewhere water drips into a black pool.",
+    "Dust hangs in pale shafts of light, thick with the smell of bone and candle wax.",
+]
+FLAVOR_LINES = [
+    "It lunges in a storm of shadow and steel, the blow ringing through your bones.",
+    "A roar shakes the ceiling as its strike lands with crushing force.",
+    "Sparks fly as its weapon carves through your guard.",
+]
+
+def make_enemy(rng, room, boss=False, hp_range=None, atk_range=None):
+    ranges = boss_stat_ranges(room) if boss else enemy_stat_ranges(room)
+    min_hp, max_hp = hp_range or ranges[:2]
+    min_atk, max_atk = atk_range or ranges[2:]
+    effect = rng.choice(["burn", "freeze"])
+    data = {
+        "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+        "description": "A creature shaped by the dungeon's hunger.",
+        "hp": rng.randint(min_hp, max(min_hp, max_hp)),
+        "atk": rng.randint(min_atk, max(min_atk, max_atk)),
+    }
+    data["special"] = None
+    if boss or rng.random() < 0.5:
+        data["special"] = {"name": f"{effect.title()} Strike", "effect": effect,
+                           "description": f"You are struck by {effect}!"}
+    return data
+
+def reply_for(prompt, rng):
+    # (text, is_json) for a chat prompt
+    room = int((re.search(r"room (\d+)", prompt) or re.search(r"(\d+)", prompt) or [0, 1])[1])
+    if "consecutive fantasy dungeon rooms" in prompt:
+        first, last = map(int, re.search(r"numbered (\d+) to (\d+)", prompt).groups())
+        rooms = []
+        for number in range(first, last + 1):
+            hp = re.search(rf"Room {number}: enemy HP (\d+)-(\d+), ATK (\d+)-(\d+)", prompt)
+            bounds = list(map(int, hp.groups())) if hp else None
+            enemy = make_enemy(rng, number, hp_range=bounds and bounds[:2], atk_range=bounds and bounds[2:])
+            rooms.append({"room": number, "description": rng.choice(ROOM_LINES), "enemy": enemy})
+        return json.dumps(rooms), True
+    if "distinct fantasy dungeon enemies" in prompt:
+        count = int(re.search(r"Create (\d+)", prompt)[1])
+        hp = tuple(map(int, re.search(r"HP \((\d+)-(\d+)\)", prompt).groups()))
+        atk = tuple(map(int, re.search(r"ATK \((\d+)-(\d+)\)", prompt).groups()))
+        return json.dumps({"enemies": [make_enemy(rng, room, hp_range=hp, atk_range=atk) for _ in range(count)]}), True
+    if "JSON" in prompt and "boss" in prompt:
+        return json.dumps(make_enemy(rng, room, boss=True)), True
+    if "JSON" in prompt:
+        hp = re.search(r"HP \((\d+)-(\d+)\)", prompt)
+        atk = re.search(r"ATK \((\d+)-(\d+)\)", prompt)
+        return json.dumps(make_enemy(rng, room,
+                                     hp_range=hp and tuple(map(int, hp.groups())),
+                                     atk_range=atk and tuple(map(int, atk.groups())))), True
+    if "quest" in prompt:
+        return "Recover the Ember Crown from the lowest vault before the wardens wake.", False
+    if "pill" in prompt:
+        return "Your veins glow faintly as the pill's strange magic takes hold.", False
+    if "death" in prompt:
+        return f"In room {room} the torches dim, and the dungeon claims one more wanderer.", False
+    if "boss" in prompt:
+        return rng.choice(FLAVOR_LINES), False
+    return rng.choice(ROOM_LINES), False
+
+def malform(text, rng):
+    # The near misses real models produce: code fences, chatter, truncation
+    kind = rng.randrange(3)
+    if kind == 0:
+        return f"```json\n{text}\n```"
+    if kind == 1:
+        return f"Here is your creature:\n{text}\nEnjoy the fight!"
+    return text[: max(1, len(text) - 7)]
+
+def tiny_png(size, seed_bytes):
+    # A solid-colour RGB PNG, no imaging library needed
+    r, g, b = seed_bytes[0], seed_bytes[1], seed_bytes[2]
+    row = b"\x00" + bytes([r, g, b]) * size
+    raw = zlib.compress(row * size, 6)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", raw) + chunk(b"IEND", b"")
+
+def count_tokens(text):
+    return max(1, len(text.split()))
+
+# === HTTP Handler ===
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pools get reused
+    config = None
+    images = {}
+    ids = itertools.count(1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass  # the client hung up mid keep-alive
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def fail_maybe(self):
+        if self.config.roll() >= self.config.error_rate:
+            return False
+        status = 429 if self.config.roll() < 0.5 else 500
+        self.send_json(status, {"error": {"message": "Injected failure", "type": "server_error", "code": status}})
+        return True
+
+    def do_POST(self):
+        body = self.read_json()
+        time.sleep(self.config.delay(body.get("model")))
+        if self.fail_maybe():
+            return
+        if self.path.endswith("/chat/completions"):
+            self.chat(body)
+        elif self.path.endswith("/images/generations"):
+            self.image(body)
+        else:
+            self.send_json(404, {"error": {"message": f"No route {self.path}"}})
+
+    def do_GET(self):
+        data = self.images.get(self.path.rsplit("/", 1)[-1])
+        if data is None:
+            self.send_json(404, {"error": {"message": "No such image"}})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def chat(self, body):
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        with self.config.lock:
+            text, is_json = reply_for(prompt, self.config.rng)
+        # Structured output (response_format) always comes back as valid JSON
+        if is_json and not body.get("response_format") and self.config.roll() < self.config.malformed_rate:
+            with self.config.lock:
+                text = malform(text, self.config.rng)
+        model = body.get("model", "gpt-4")
+        completion_id = f"chatcmpl-fake{next(self.ids)}"
+        usage = {"prompt_tokens": count_tokens(prompt), "completion_tokens": count_tokens(text),
+                 "total_tokens": count_tokens(prompt) + count_tokens(text)}
+
+        if not body.get("stream"):
+            self.send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        # Server-sent events, one word per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word + (" " if i < len(words) - 1 else "")}
+            self.send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            time.sleep(self.config.token_delay)
+        self.send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (body.get("stream_options") or {}).get("include_usage"):
+            self.send_event({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [], "usage": usage})
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def send_event(self, payload):
+        self.send_chunk(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def image(self, body):
+        prompt = body.get("prompt", "")
+        png = tiny_png(self.config.image_size, hashlib.sha1(prompt.encode("utf-8")).digest())
+        if body.get("response_format") == "b64_json":
+            item = {"b64_json": base64.b64encode(png).decode("ascii"), "revised_prompt": prompt}
+        else:
+            name = f"img{next(self.ids)}.png"
+            self.images[name] = png
+            host, port = self.server.server_address[:2]
+            item = {"url": f"http://{host}:{port}/images/{name}", "revised_prompt": prompt}
+        self.send_json(200, {"created": int(time.time()), "data": [item] * int(body.get("n", 1))})
+
+def start_server(config, host="127.0.0.1", port=0):
+    # Serves on a background thread; port 0 picks a free one.
+    # Returns (server, base_url) -- call server.shutdown() to stop.
+    handler = type("Handler", (FakeOpenAIHandler,), {"config": config, "images": {}})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake OpenAI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--token-delay", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="latency for one model, e.g. gpt-4o=lognormal:2.0,0.4 (repeatable)")
+    args = parser.parse_args()
+
+    config = FakeConfig(args.latency, args.token_delay, args.error_rate, args.malformed_rate,
+                        args.image_size, args.seed, dict(spec.split("=", 1) for spec in args.model_latency))
+    server, base_url = start_server(config, args.host, args.port)
+    print(f"Fake OpenAI listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import base64
+import json
+import os
+import random
+import threading
+from collections import deque
+
+import pygame
+
+from engine import Enemy
+
+# === Input Traces ===
+# A run recorded with trace_record=PATH can be replayed exactly with
+# replay.py. A trace holds everything the main thread can't reproduce on
+# its own:
+#   - the seed of the global random module (the engine's dice)
+#   - the save it started from, if any
+#   - the input events of each frame (keys, clicks, quit)
+#   - the result of every background content job (room text, enemies,
+#     narration), in submission order
+#   - which GPT callbacks fired in which frame, and what each "is the room
+#     ready yet" check answered, since both depend on timing
+# On replay the jobs aren't run at all: their results come out of the trace,
+# and the callbacks fire in the recorded frames, so the game goes through
+# the same states with no network and no waiting.
+#
+# One JSON record per line, written as the run goes, so a trace survives
+# a crash up to its last frame.
+
+VERSION = 1
+RECORDED_EVENTS = (pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN)
+EVENT_FIELDS = ("pos", "button", "key", "mod", "unicode", "scancode")
+
+def open_trace():
+    # A recorder, a player or None, from the trace_record / trace_replay settings
+    if os.getenv('trace_replay'):
+        return TracePlayer(os.getenv('trace_replay'))
+    if os.getenv('trace_record'):
+        return TraceRecorder(os.getenv('trace_record'), int(os.getenv('seed') or random.SystemRandom().randrange(2 ** 32)))
+    return None
+
+class TraceRecorder:
+    replaying = False
+
+    def __init__(self, path, seed):
+        self.seed = seed
+        self.frame = 0
+        self.lock = threading.Lock()
+        self.file = open(path, "w", encoding="utf-8")
+        self.write({"trace": VERSION, "seed": seed})
+
+    def write(self, record):
+        # Content jobs finish on worker threads
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(json.dumps(record) + "\n")
+
+    def save_data(self, data):
+        self.write({"save": base64.b64encode(data).decode("ascii") if data else None})
+        return data
+
+    def events(self, events):
+        self.frame += 1
+        kept = [encode_event(event) for event in events if event.type in RECORDED_EVENTS]
+        if kept:
+            self.write({"frame": self.frame, "events": kept})
+        return events
+
+    def fired(self, kind, entry_id):
+        self.write({"frame": self.frame, "fired": [kind, entry_id]})
+
+    def record_result(self, call_id, fn, future):
+        if future.cancelled():
+            return
+        value = None if future.exception() is not None else future.result()
+        self.write({"call": call_id, "fn": fn.__name__, "result": encode_value(value)})
+
+    def record_ready(self, ready):
+        self.write({"ready": ready})
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class TracePlayer:
+    replaying = True
+
+    def __init__(self, path):
+        self.events_by_frame = {}
+        self.fired_by_frame = {}
+        self.results = {}
+        self.ready_checks = deque()
+        self.save = None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # cut off by a crash
+                if "trace" in record:
+                    if record["trace"] != VERSION:
+                        raise ValueError(f"Unsupported trace version {record['trace']}")
+                    self.seed = record["seed"]
+                elif "save" in record:
+                    self.save = base64.b64decode(record["save"]) if record["save"] else None
+                elif "events" in record:
+                    self.events_by_frame[record["frame"]] = record["events"]
+                elif "fired" in record:
+                    self.fired_by_frame.setdefault(record["frame"], []).append(tuple(record["fired"]))
+                elif "call" in record:
+                    self.results[record["call"]] = record
+                elif "ready" in record:
+                    self.ready_checks.append(record["ready"])
+        self.frames = sorted(set(self.events_by_frame) | set(self.fired_by_frame))
+        self.position = 0
+        self.frame = 0
+
+    def save_data(self, data):
+        return self.save  # the save the recording started from, not whatever is on disk now
+
+    def events(self, events):
+        # Frames where nothing was recorded are skipped; once the trace runs
+        # out the game is told to quit
+        if self.position >= len(self.frames):
+            return [pygame.event.Event(pygame.QUIT)]
+        self.frame = self.frames[self.position]
+        self.position += 1
+        return [decode_event(event) for event in self.events_by_frame.get(self.frame, ())]
+
+    def fired_now(self):
+        return self.fired_by_frame.pop(self.frame, [])
+
+    def result(self, call_id, fn):
+        record = self.results.get(call_id)
+        if record is None:
+            return None  # cancelled before it ran
+        if record["fn"] != fn.__name__:
+            raise RuntimeError(f"Replay diverged: call {call_id} is {fn.__name__}, the trace has {record['fn']}")
+        return decode_value(record["result"])
+
+    def ready(self):
+        return self.ready_checks.popleft() if self.ready_checks else True
+
+    def close(self):
+        pass
+
+def encode_event(event):
+    fields = {name: event.dict[name] for name in EVENT_FIELDS if name in event.dict}
+    return {"type": event.type, **fields}
+
+def decode_event(data):
+    fields = {name: tuple(value) if name == "pos" else value for name, value in data.items() if name != "type"}
+    return pygame.event.Event(data["type"], fields)
+
+def encode_value(value):
+    # Job results: str, None, Enemy, or lists/tuples of those (room batches)
+    if isinstance(value, Enemy):
+        return {"enemy": [value.name, value.description, value.hp, value.atk, value.special, value.is_boss]}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+def decode_value(data):
+    if isinstance(data, dict):
+        return Enemy(*data["enemy"])
+    if isinstance(data, list):
+        return [decode_value(item) for item in data]
+    return data
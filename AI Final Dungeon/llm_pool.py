@@ -0,0 +1,177 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# === Streamed Text ===
+# Text that grows as tokens arrive on a worker thread. str() gives whatever
+# has arrived so far, so a buffer can sit in combat_log like any other line.
+class StreamBuffer:
+    def __init__(self):
+        self.text = ""
+
+    def append(self, token):
+        self.text += token
+
+    def __str__(self):
+        return self.text
+
+
+# === Background Request Executor ===
+# GPT calls run on a small, bounded pool of worker threads. Callers get a
+# Future back right away; the game loop calls poll() once per frame, which
+# runs the completion callbacks on the main thread so they can safely touch
+# game state and pygame.
+#
+# With a journal (input_trace), job results, the frame each callback fires
+# in and every ready() answer are recorded, or, when replaying, taken from
+# the trace instead of running anything.
+class RequestExecutor:
+    def __init__(self, ask, max_workers=4, journal=None):
+        self.ask = ask
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.pending = []  # (futures, callback, epoch, entry_id)
+        self.streams = []  # (buffer, future, on_start, epoch, entry_id)
+        self.epoch = 0
+        self.journal = journal
+        self.calls = 0  # jobs submitted, numbering them for the journal
+        self.entries = 0  # callbacks registered, likewise
+
+    def replaying(self):
+        return self.journal is not None and self.journal.replaying
+
+    def next_entry(self):
+        self.entries += 1
+        return self.entries
+
+    def submit(self, prompt, callback=None, **kwargs):
+        return self.submit_call(self.ask, prompt, callback=callback, **kwargs)
+
+    def submit_call(self, fn, *args, callback=None, **kwargs):
+        call_id = self.calls
+        self.calls += 1
+        if self.replaying():
+            future = Future()
+            future.set_result(self.journal.result(call_id, fn))
+        else:
+            future = self.pool.submit(fn, *args, **kwargs)
+            if self.journal is not None:
+                future.add_done_callback(lambda done: self.journal.record_result(call_id, fn, done))
+        if callback is not None:
+            self.pending.append(((future,), callback, self.epoch, self.next_entry()))
+        return future
+
+    def stream(self, prompt, on_start, callback=None, **kwargs):
+        # on_start(buffer) runs on the main thread once the first tokens are
+        # in, so the line only shows up when there is something to read
+        buffer = StreamBuffer()
+        future = self.submit(prompt, callback=callback, stream=buffer, **kwargs)
+        if self.replaying():
+            buffer.text = future.result() or ""
+        self.streams.append((buffer, future, on_start, self.epoch, self.next_entry()))
+        return buffer
+
+    def when_all(self, futures, callback):
+        # callback(*results) once every future has finished
+        self.pending.append((tuple(futures), callback, self.epoch, self.next_entry()))
+
+    def ready(self, futures):
+        # Whether every future has finished. That depends on timing, so the
+        # answer goes through the journal.
+        if self.replaying():
+            return self.journal.ready()
+        ready = all(f.done() for f in futures)
+        if self.journal is not None:
+            self.journal.record_ready(ready)
+        return ready
+
+    def derive(self, future, fn):
+        # A future for fn(result) that shares the underlying request, e.g. one
+        # room out of a batch. Cancelling it leaves the request running.
+        derived = Future()
+
+        def relay(done):
+            if derived.cancelled():
+                return
+            if done.cancelled():
+                derived.cancel()
+                return
+            try:
+                derived.set_result(fn(done.result()))
+            except Exception as e:
+                derived.set_exception(e)
+
+        future.add_done_callback(relay)
+        return derived
+
+    def busy(self):
+        return bool(self.pending or self.streams)
+
+    def invalidate(self):
+        # Drop everything in flight, e.g. on restart. Work that already
+        # started still finishes, but its callback never runs.
+        for futures, _, _, _ in self.pending:
+            for future in futures:
+                future.cancel()
+        self.pending = []
+        self.streams = []
+        self.epoch += 1
+
+    def poll(self):
+        if self.replaying():
+            return self.replay_poll()
+
+        waiting = []
+        for entry in self.streams:
+            buffer, future, on_start, epoch, entry_id = entry
+            if buffer.text:
+                if self.journal is not None:
+                    self.journal.fired("start", entry_id)
+                on_start(buffer)
+            elif not future.done():
+                waiting.append(entry)
+        self.streams = waiting
+
+        ready = []
+        still_pending = []
+        for entry in self.pending:
+            futures, callback, epoch, entry_id = entry
+            if all(f.done() for f in futures):
+                ready.append(entry)
+            else:
+                still_pending.append(entry)
+        self.pending = still_pending
+
+        for futures, callback, epoch, entry_id in ready:
+            if epoch != self.epoch:
+                continue
+            if self.journal is not None:
+                self.journal.fired("done", entry_id)
+            callback(*[self.result(f) for f in futures])
+        return len(ready)
+
+    def replay_poll(self):
+        # Fires exactly the callbacks the recording fired in this frame, in
+        # the same order; every result is already there
+        fired = self.journal.fired_now()
+        for kind, entry_id in fired:
+            entries = self.streams if kind == "start" else self.pending
+            entry = next((e for e in entries if e[-1] == entry_id), None)
+            if entry is None:
+                raise RuntimeError(f"Replay diverged: no {kind} callback {entry_id} to fire")
+            entries.remove(entry)
+            if kind == "start":
+                entry[2](entry[0])
+            else:
+                entry[1](*[self.result(f) for f in entry[0]])
+        return len(fired)
+
+    def result(self, future):
+        if future.cancelled():
+            return None
+        error = future.exception()
+        if error is not None:
+            print("GPT call failed:", error)
+            return None
+        return future.result()
+
+    def shutdown(self):
+        self.invalidate()
+        self.pool.shutdown(wait=False, cancel_futures=True)
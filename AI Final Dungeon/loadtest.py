@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# === Server Load Test ===
+# N simulated players against server.py, each on its own connection, playing
+# a simple policy with a random think time between actions. Reports action
+# latency percentiles (overall and per command) and the server's CPU use as
+# sessions per core:
+#
+#   python loadtest.py --spawn --players 200 --actions 40 --latency lognormal:1.0,0.5
+#
+# --spawn starts server.py on a free port, pointed at the local fake OpenAI
+# server (or with --local, at no API at all); otherwise --host/--port name a
+# server that is already running.
+
+def choose(state, rng):
+    if state["game_over"]:
+        return "new"
+    if state["post_boss_shop"]:
+        return "shop 4"
+    if state["in_combat"]:
+        if state["hp"] < 30 and state["inventory"].get("Healing Potion"):
+            return "use Healing Potion"
+        return "special" if state["special_ready"] else "attack"
+    if state["gold"] >= 10 and state["inventory"].get("Healing Potion", 0) < 2 and rng.random() < 0.3:
+        return "buy 1"
+    return "advance"
+
+async def request(reader, writer, line):
+    writer.write(line.encode("utf-8") + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def player(args, seed, latencies):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(args.host, args.port, limit=2 ** 16)
+    state = json.loads(await reader.readline())["state"]
+    for _ in range(args.actions):
+        await asyncio.sleep(rng.uniform(0, 2 * args.think))
+        command = choose(state, rng)
+        started = time.perf_counter()
+        reply = await request(reader, writer, command)
+        latencies.setdefault(command.split()[0], []).append(time.perf_counter() - started)
+        state = reply["state"]
+    writer.write(b"quit\n")
+    writer.close()
+
+async def server_stats(args):
+    reader, writer = await asyncio.open_connection(args.host, args.port, limit=2 ** 16)
+    await reader.readline()
+    stats = (await request(reader, writer, "stats"))["stats"]
+    writer.write(b"quit\n")
+    writer.close()
+    return stats
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def describe(values):
+    return (f"n={len(values):<6} p50 {percentile(values, 0.5) * 1000:7.1f} ms  "
+            f"p95 {percentile(values, 0.95) * 1000:7.1f} ms  p99 {percentile(values, 0.99) * 1000:7.1f} ms  "
+            f"max {max(values) * 1000:7.1f} ms")
+
+async def run(args):
+    before = await server_stats(args)
+    latencies = {}
+    started = time.perf_counter()
+    players = [player(args, args.seed + i, latencies) for i in range(args.players)]
+    results = await asyncio.gather(*players, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    after = await server_stats(args)
+
+    failed = [r for r in results if isinstance(r, Exception)]
+    every = [value for values in latencies.values() for value in values]
+    cores = (after["cpu_seconds"] - before["cpu_seconds"]) / elapsed
+    print(f"\n{args.players} players x {args.actions} actions, think {args.think}s: {elapsed:.1f}s wall, "
+          f"{len(every) / elapsed:.0f} actions/s, {len(failed)} players failed")
+    if failed:
+        print("  first failure:", repr(failed[0]))
+    if every:
+        print(f"  {'all':>8}: {describe(every)}")
+        for command, values in sorted(latencies.items()):
+            print(f"  {command:>8}: {describe(values)}")
+    print(f"Server CPU: {cores:.2f} cores busy -> {args.players / max(cores, 1e-9):.0f} sessions per core")
+    if "llm" in after:
+        print("Server LLM:", after["llm"])
+
+def spawn_server(args):
+    env = dict(os.environ)
+    if not args.local:
+        from fake_openai import FakeConfig, start_server
+        fake, base_url = start_server(FakeConfig(args.latency, seed=args.seed))
+        env.update(api_base_url=base_url, api_key=env.get("api_key", "fake"),
+                   cache_path=os.path.join(tempfile.mkdtemp(), "gpt_cache.json"))
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py"),
+               "--port", "0", "--concurrency", str(args.concurrency)] + (["--local"] if args.local else [])
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True)
+    banner = process.stdout.readline()  # "Dungeon server on HOST:PORT (...)"
+    args.host, args.port = banner.split()[3].rsplit(":", 1)
+    args.port = int(args.port)
+    print(banner.strip())
+    threading.Thread(target=lambda: sys.stdout.writelines(process.stdout), daemon=True).start()  # keep the pipe drained
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the dungeon server with simulated players.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8770)
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--actions", type=int, default=30, help="actions per player")
+    parser.add_argument("--think", type=float, default=0.5, help="mean seconds between a player's actions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--spawn", action="store_true", help="start server.py (and a fake OpenAI server) first")
+    parser.add_argument("--local", action="store_true", help="with --spawn: the server uses local content only")
+    parser.add_argument("--latency", default="lognormal:1.0,0.5", help="with --spawn: the fake server's latency")
+    parser.add_argument("--concurrency", type=int, default=16, help="with --spawn: the server's GPT concurrency")
+    args = parser.parse_args()
+
+    process = spawn_server(args) if args.spawn else None
+    try:
+        asyncio.run(run(args))
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGINT)  # the server prints its stats on the way out
+            process.wait()
+
+if __name__ == "__main__":
+    main()
@@ -1,167 +1,350 @@
+import time
+launch_time = time.perf_counter()  # before the other imports, for the startup report
 import pygame
 import sys
 import random
 import os
 import json
-from openai import OpenAI
+import atexit
+import threading
 from dotenv import load_dotenv
+from llm_pool import RequestExecutor, StreamBuffer
+from content_cache import ContentCache
+from prefetch import RoomPlan, RoomPrefetcher
+from text_cache import TextLayoutCache
+from asset_bank import AssetBank
+from savegame import AutoSaver, encode_snapshot, restore_snapshot
+from telemetry import Telemetry, FRAME_BUCKETS
+from routing import ModelRouter, Route
+from enemy_schema import ENEMY_FORMAT, BESTIARY_FORMAT, parse_lenient, enemy_from_data
+from bestiary import Bestiary
+from api_client import CircuitBreaker, CircuitOpen, ResilientClient, TokenBucket
+from input_trace import open_trace
+from run_memory import RunMemory
+from engine import Enemy, Game, LocalContent, enemy_stat_ranges, boss_stat_ranges, enter_shop, enter_hp_shop
+
+# === Input Trace ===
+# trace_record=PATH records this run for replay.py; the engine's dice are
+# seeded from the trace so a replay rolls the same numbers
+trace = open_trace()
+if trace is not None:
+    random.seed(trace.seed)
+    atexit.register(trace.close)
+replaying = trace is not None and trace.replaying
 
 # === Load API Key ===
 load_dotenv()
 key = os.getenv('api_key')
-client = OpenAI(api_key=key)
 
-# === GPT Functions ===
-def ask_gpt(prompt, temperature=0.8):
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=temperature,
-        max_tokens=150
-    )
-    return response.choices[0].message.content.strip()
+def build_client():
+    # Importing openai takes about as long as everything else before the menu,
+    # so the client is only built by the first request, on a worker thread.
+    # api_base_url points the game at any OpenAI-compatible server instead, e.g.
+    # the local fake_openai.py (http://127.0.0.1:8765/v1) for offline play and benchmarks.
+    # The SDK's own retries are off; api (below) retries with backoff instead.
+    from openai import OpenAI
+    client = OpenAI(api_key=key, base_url=os.getenv('api_base_url') or None, max_retries=0)
+    mark_startup("client_ready")
+    return client
+
+# One client, rate limit and circuit breaker shared by every worker thread,
+# so a room advance waits at most api_deadline seconds on a degraded API
+api = ResilientClient(
+    build_client,
+    TokenBucket(float(os.getenv('api_rate', 3)), int(os.getenv('api_burst', 6))),
+    CircuitBreaker(int(os.getenv('breaker_failures', 5)), float(os.getenv('breaker_reset', 30))),
+    retries=int(os.getenv('api_retries', 4)),
+    deadline=float(os.getenv('api_deadline', 20)),
+    attempt_timeout=float(os.getenv('api_timeout', 10))
+)
+atexit.register(lambda: print("API client:", api.stats()))
 
-def safe_ask_gpt(prompt, attempts=2):
-    for _ in range(attempts):
-        try:
-            return ask_gpt(prompt)
-        except Exception as e:
-            print("GPT call failed:", e)
-    return None
-
-# === Game Classes ===
-class Player:
-    def __init__(self, hp=100):
-        self.hp = hp
-        self.inventory = {}
-        self.gold = 50
-        self.blocks_remaining = 0  
-        self.atk_bonus = 0
-        self.status_effects = {}
-
-    def attack(self, enemy):
-        base_damage = random.randint(5, 15)
-        total_damage = base_damage + self.atk_bonus
-        enemy.hp -= total_damage
-        return f"You hit the {enemy.name} for {total_damage} damage!"
-        
+# === GPT Response Cache ===
+cache = ContentCache(
+    os.getenv('cache_path', "gpt_cache.json"),
+    max_entries=int(os.getenv('cache_max_entries', 500)),
+    variants=int(os.getenv('cache_variants', 3))
+)
+cache.start_flusher(float(os.getenv('cache_flush_interval', 5)))
+atexit.register(cache.close)
+atexit.register(lambda: print("GPT cache:", cache.stats()))
+
+# === Telemetry ===
+# Per call site (room, enemy, boss, room_batch, quest, boss_flavor, pill,
+# death) and per frame, exported to telemetry.jsonl / telemetry.prom
+telemetry = Telemetry()
+telemetry.counter("gpt_calls_total", "GPT calls by call site and outcome (ok, error, cache_hit, circuit_open).")
+telemetry.counter("gpt_retries_total", "Repeated GPT calls, by reason: error or rate_limited (backed off), invalid (unusable reply) or truncated (cut off by the token budget).")
+telemetry.counter("gpt_json_failures_total", "Replies with no usable JSON, even after local repair.")
+telemetry.counter("enemies_generated_total", "Enemies and bosses created, by call site and source (gpt, bestiary or local).")
+telemetry.counter("bestiary_added_total", "New enemies stored in the bestiary by background refills, per tier.")
+telemetry.counter("gpt_prompt_tokens_total", "Prompt tokens billed.")
+telemetry.counter("gpt_completion_tokens_total", "Completion tokens billed.")
+telemetry.counter("route_downgrades_total", "Call sites moved to a faster model tier after missing their SLO.")
+telemetry.histogram("gpt_call_seconds", "Latency of successful GPT API calls.")
+telemetry.histogram("gpt_first_token_seconds", "Time to the first streamed token.")
+telemetry.histogram("perceived_wait_seconds", "Player wait after a key press, per room advance or combat turn.")
+telemetry.histogram("frame_seconds", "Main loop work per frame, excluding the frame-rate sleep.", FRAME_BUCKETS)
+telemetry.histogram("event_seconds", "Input handling per frame with events.", FRAME_BUCKETS)
+telemetry.histogram("startup_seconds", "Time from launch to each startup stage.")
+telemetry.histogram("save_seconds", "Main-thread cost of an autosave snapshot (op=encode) and of resuming (op=resume).",
+                    FRAME_BUCKETS)
+
+TELEMETRY_PATH = os.getenv('telemetry_path', "telemetry")
+if TELEMETRY_PATH:
+    telemetry_files = (TELEMETRY_PATH + ".jsonl", TELEMETRY_PATH + ".prom")
+    telemetry.start_exporter(*telemetry_files, interval=float(os.getenv('telemetry_interval', 10)))
+    atexit.register(telemetry.close, *telemetry_files)
+
+# === Startup Stages ===
+# The menu is drawn first; the GPT client, sounds and the first room come in
+# behind it. Each stage's time since launch is recorded once.
+startup_marks = {}
+
+def mark_startup(stage):
+    if stage not in startup_marks:
+        startup_marks[stage] = time.perf_counter() - launch_time
+        telemetry.observe("startup_seconds", startup_marks[stage], stage=stage)
+
+atexit.register(lambda: print("Startup:", {stage: f"{seconds * 1000:.0f} ms" for stage, seconds in startup_marks.items()}))
+
+# === Model Routing ===
+# Per call site: model tiers (preferred first), token ceiling, temperature
+# and latency SLO in seconds (to the first token when streamed). Prose that
+# blocks a combat turn gets small fast models; bosses keep the strong one.
+# Budgets stay at the ceiling, except the bestiary's, which may shrink to
+# its min_tokens. Enemy and boss tiers need structured-output support. model_routes in .env
+# overrides any of it as JSON, e.g.
+#   model_routes={"boss_flavor": {"models": ["gpt-4o-mini"], "slo": 0.8}}
+JSON_MODEL = os.getenv('json_model', "gpt-4o")
+ROUTES = {
+    "room": {"models": ["gpt-4o", "gpt-4o-mini"], "max_tokens": 150, "slo": 3.0},
+    "enemy": {"models": [JSON_MODEL, "gpt-4o-mini"], "max_tokens": 200, "slo": 4.0},
+    "boss": {"models": [JSON_MODEL], "max_tokens": 250, "slo": 8.0},
+    "bestiary": {"models": [JSON_MODEL, "gpt-4o-mini"], "max_tokens": 2000, "min_tokens": 1000, "slo": 30.0},
+    "room_batch": {"models": ["gpt-4o", "gpt-4o-mini"], "max_tokens": 1200, "slo": 10.0},
+    "quest": {"models": ["gpt-4o-mini"], "max_tokens": 60, "temperature": 0.9, "slo": 3.0},
+    "boss_flavor": {"models": ["gpt-4o-mini", "gpt-4.1-nano"], "max_tokens": 80, "temperature": 0.9, "slo": 1.0},
+    "pill": {"models": ["gpt-4o-mini", "gpt-4.1-nano"], "max_tokens": 60, "temperature": 0.9, "slo": 1.0},
+    "death": {"models": ["gpt-4o", "gpt-4o-mini"], "max_tokens": 100, "slo": 2.0},
+    "summary": {"models": ["gpt-4o-mini", "gpt-4.1-nano"], "max_tokens": 120, "temperature": 0.3, "slo": 10.0},
+}
+for site, overrides in json.loads(os.getenv('model_routes', "{}")).items():
+    ROUTES[site] = {**ROUTES.get(site, {"models": ["gpt-4o-mini"]}), **overrides}
+router = ModelRouter({site: Route(**config) for site, config in ROUTES.items()}, default=Route(["gpt-4o-mini"]))
+atexit.register(lambda: print("Model routing:\n" + "\n".join(router.report())))
 
-    def heal(self, amount):
-        self.hp += amount
-        return f"You healed for {amount} HP."
+# === GPT Functions ===
+# Real API requests made and rooms entered, for the requests-per-room report
+api_stats = {"requests": 0, "rooms": 0}
+api_stats_lock = threading.Lock()
+
+# Prose (room text, boss flavor, pill effects, death narration) is streamed
+# token by token into a StreamBuffer when one is passed in
+STREAM_TEXT = os.getenv('stream_text', "1") != "0"
+
+def ask_gpt(prompt, temperature=None, cached=True, max_tokens=None, stream=None, site="other",
+            response_format=None, context=None, reusable=True):
+    # Model, token budget and temperature come from the site's route unless given.
+    # context (the run memory) goes in a system message ahead of the prompt.
+    # Replies written for this run alone (reusable=False, or with the run
+    # memory as context: they name its quest and foes) are neither looked up
+    # in the cache nor stored in it, as no other run could use them.
+    model, routed_tokens, routed_temperature = router.pick(site)
+    max_tokens = max_tokens or routed_tokens
+    temperature = routed_temperature if temperature is None else temperature
+    messages = [{"role": "user", "content": prompt}]
+    if context:
+        messages.insert(0, {"role": "system", "content": context})
+    reusable = reusable and not context
+    if cached and reusable:
+        text = cache.get(prompt, model, temperature)
+        if text is not None:
+            telemetry.inc("gpt_calls_total", site=site, outcome="cache_hit")
+            if stream is not None:
+                stream.text = text
+            return text
+
+    streamed = stream is not None and STREAM_TEXT
+
+    def request(client, timeout):
+        # One attempt: (text, usage, finish_reason, latency), the latency the
+        # router judges: to the first token when streamed, else the whole
+        # attempt (backoff between attempts isn't the model's fault)
+        attempt_started = time.perf_counter()
+        if streamed:
+            stream.text = ""  # a retry after an error starts over
+            first_token = usage = finish_reason = None
+            chunks = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout
+            )
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - attempt_started
+                        telemetry.observe("gpt_first_token_seconds", first_token, site=site, model=model)
+                    stream.append(chunk.choices[0].delta.content)
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                usage = chunk.usage or usage
+            return stream.text.strip(), usage, finish_reason, first_token
+
+        extra = {"response_format": response_format} if response_format else {}
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            **extra
+        )
+        text = response.choices[0].message.content.strip()
+        return text, response.usage, response.choices[0].finish_reason, time.perf_counter() - attempt_started
 
-    def take_damage(self, damage):
-        if self.blocks_remaining > 0:
-            self.blocks_remaining -= 1
-            block_sound.play()
-            return f"You blocked the attack! ({self.blocks_remaining} blocks left)"
-        else:
-            self.hp -= damage
-            random.choice(damage_sounds).play()
-            return f"You took {damage} damage!"
+    def on_retry(error, delay):
+        reason = "rate_limited" if getattr(error, "status_code", None) == 429 else "error"
+        telemetry.inc("gpt_retries_total", site=site, reason=reason)
 
-    def buy(self, item, cost):
-        if self.gold >= cost:
-            self.gold -= cost
-            
+    while True:
+        with api_stats_lock:
+            api_stats["requests"] += 1
+        started = time.perf_counter()
+        try:
+            text, usage, finish_reason, latency = api.call(request, on_retry=on_retry)
+        except CircuitOpen:
+            telemetry.inc("gpt_calls_total", site=site, outcome="circuit_open")
+            raise
+        except Exception:
+            telemetry.inc("gpt_calls_total", site=site, outcome="error")
+            raise
+        elapsed = time.perf_counter() - started
+        telemetry.observe("gpt_call_seconds", elapsed, site=site, model=model)
+        telemetry.inc("gpt_calls_total", site=site, outcome="ok")
+        truncated = finish_reason == "length"
+        downgrade = router.record(site, model, latency if latency is not None else elapsed,
+                                  usage.completion_tokens if usage is not None else None, truncated)
+        if downgrade:
+            telemetry.inc("route_downgrades_total", site=site, model=downgrade[1])
+            print(f"Routing {site} from {downgrade[0]} to {downgrade[1]}: too slow for its {router.route(site).slo}s SLO")
+        if usage is not None:
+            telemetry.inc("gpt_prompt_tokens_total", usage.prompt_tokens, site=site)
+            telemetry.inc("gpt_completion_tokens_total", usage.completion_tokens, site=site)
+        # Cut off by a budget the router had shrunk: once more at the route's
+        # ceiling. Streamed narration the player is already reading isn't
+        # taken back; it just ends there.
+        ceiling = router.route(site).max_tokens
+        if not truncated or streamed or max_tokens >= ceiling:
+            break
+        telemetry.inc("gpt_retries_total", site=site, reason="truncated")
+        max_tokens = ceiling
+    if streamed and truncated and not text.endswith((".", "!", "?", "...")):
+        text += "..."
+    if stream is not None:
+        stream.text = text
+    if reusable and not truncated:  # a cut-off sentence isn't worth keeping
+        cache.put(prompt, model, temperature, text)
+    return text
+
+def safe_ask_gpt(prompt, **kwargs):
+    # None when the API can't give an answer (transient errors are already
+    # retried by api); callers then fall back to local content
+    try:
+        return ask_gpt(prompt, **kwargs)
+    except CircuitOpen:
+        return None
+    except Exception as e:
+        print("GPT call failed:", e)
+        return None
+
+# All GPT traffic goes through this pool so the game loop never blocks on it
+llm = RequestExecutor(safe_ask_gpt, max_workers=4, journal=trace)
 
-            if item == "Attack Buff":
-                self.atk_bonus += 5  
-                return f"You bought {item} for {cost} gold. Attack +5!"
-            
-            self.inventory[item] = self.inventory.get(item, 0) + 1
-            return f"You bought {item} for {cost} gold."
-        else:
-            return "Not enough gold."
-    
-    def special_attack(self, enemy, effect="burn"):
-        base_damage = random.randint(8, 18)
-        total_damage = base_damage + self.atk_bonus
-        enemy.hp -= total_damage
-        if effect == "burn":
-            enemy.status_effects["burn"] = 3
-            return f"You unleash a fire blast! The {enemy.name} takes {total_damage} damage and is burning!"
-        elif effect == "freeze":
-            enemy.status_effects["freeze"] = 2
-            return f"You freeze the enemy! The {enemy.name} takes {total_damage} damage and may skip actions!"
-        else:
-            return f"You use a mysterious force! The {enemy.name} takes {total_damage} damage."
-
-class Enemy:
-    def __init__(self, name, description, hp, atk, special=None, is_boss=False):
-        self.name = name
-        self.description = description
-        self.hp = hp
-        self.atk = atk
-        self.is_boss = is_boss
-        self.status_effects = {}
-        self.special = special 
-
-    def attack(self, player):
-        log = []
-
-        # Freeze check
-        if self.status_effects.get("freeze", 0) > 0:
-            self.status_effects["freeze"] -= 1
-            log.append(f"{self.name} is frozen and skips its turn!")
-            return "\n".join(log)
-
-        # Base damage
-        damage = random.randint(1, self.atk)
-        log.append(player.take_damage(damage))
-
-        # Burn damage if enemy is burning
-        if self.status_effects.get("burn", 0) > 0:
-            burn_dmg = 5
-            self.hp -= burn_dmg
-            self.status_effects["burn"] -= 1
-            log.append(f"{self.name} is burning! (-{burn_dmg} HP)")
-
-        # Attempt special attack (burn/freeze)
-        if self.special and random.random() < 0.4:  # 40% chance to use special
-            effect = self.special.get("effect")
-            if effect == "burn":
-                player.status_effects["burn"] = 3
-                log.append(self.special.get("description", f"{self.name} scorches you! You are burning!"))
-            elif effect == "freeze":
-                player.status_effects["freeze"] = 2
-                log.append(self.special.get("description", f"{self.name} freezes you solid!"))
-
-        # Boss GPT flavor (optional)
-        if self.is_boss:
-            try:
-                gpt_prompt = (
-                    f"Write a short, dramatic description (1–2 sentences) of a fantasy boss named '{self.name}' "
-                    f"attacking the player and dealing {damage} damage. Make it vivid and action-packed."
-                )
-                gpt_description = safe_ask_gpt(gpt_prompt)
-                if gpt_description:
-                    log.append(gpt_description)
-            except:
-                log.append(f"{self.name} strikes fiercely for {damage} damage!")  # fallback
-
-        return "\n".join(log)
+seen_enemies = set()
 
+# === Run Memory ===
+# A summary of the run so far, capped at memory_tokens, sent along with the
+# narration that tells the run's story (boss attacks, death) so it hangs
+# together. Room descriptions don't draw on it and go without, so they stay
+# cacheable; the narration skips the GPT cache while there's memory to send,
+# since its replies are this run's. memory_tokens=0 turns it off.
+memory = RunMemory(budget=int(os.getenv('memory_tokens', 120)), every=int(os.getenv('memory_every', 5)))
+atexit.register(lambda: print("Run memory:", memory.stats()))
 
-seen_enemies = set()
+def summarize_run(prompt):
+    return safe_ask_gpt(prompt, site="summary", reusable=False)
+
+def remember_room(golden=False, enemy=None):
+    memory.enter_room(game.room_count, golden, enemy)
+    if memory.due():
+        llm.submit_call(summarize_run, memory.summary_prompt(), callback=memory.absorb)
 
 
 # === GPT-Generated Content ===
-def generate_room():
-    combat_log.append("Generating room description...")
-    render_and_flip(temp_room_text="Generating room description...") 
+def generate_room(stream=None):
     prompt = "Describe a fantasy dungeon room in 1-3 sentences with atmosphere, lighting, smells, and sounds."
-    return safe_ask_gpt(prompt)
+    return (safe_ask_gpt(prompt, stream=stream, site="room")
+            or local_content.room_text(game.room_count))
+
+# Enemies and bosses are asked for as structured output against ENEMY_SCHEMA
+# (their routes use json_model, as plain gpt-4 doesn't support it). Replies
+# are still parsed leniently and clamped to the room's ranges, so a
+# re-request is only needed when a reply has nothing usable (or a name
+# already met).
+local_content = LocalContent(random.Random())  # used on worker threads, so not the game's dice
+
+# Regular enemies are drawn from the bestiary, topped up in the background a
+# tier at a time; a live request is only made when a tier has run dry
+BESTIARY_REFILL = int(os.getenv('bestiary_refill', 8))  # enemies per refill request
+
+def refill_bestiary(tier):
+    # On its own thread, so a new run's llm.invalidate() can't drop it
+    ranges = Bestiary.stat_ranges(tier)
+    min_hp, max_hp, min_atk, max_atk = ranges
+    first, last = Bestiary.rooms(tier)
+    known = sorted(entry[0] for entry in bestiary.entries[tier])[-40:]
+    prompt = (
+        f"Create {BESTIARY_REFILL} distinct fantasy dungeon enemies for rooms {first}-{last}. "
+        f"Give each a name, description, HP ({min_hp}-{max_hp}), ATK ({min_atk}-{max_atk}), "
+        f"and an optional burn or freeze special ability. "
+        + (f"Don't reuse any of these names: {', '.join(known)}. " if known else "")
+        + 'Respond ONLY in JSON like:\n{"enemies": [{"name": "", "description": "", "hp": 50, "atk": 10, '
+        '"special": {"name": "Frost Bite", "effect": "freeze", "description": "The enemy bites with icy fangs!"}}]}'
+    )
+    enemies = []
+    try:
+        data = parse_lenient(safe_ask_gpt(prompt, cached=False, site="bestiary", response_format=BESTIARY_FORMAT))
+        items = data.get("enemies") if isinstance(data, dict) else data
+        for item in items if isinstance(items, list) else []:
+            enemy = enemy_from_data(item, ranges)
+            if enemy is not None:
+                enemies.append(enemy)
+    finally:
+        added = bestiary.finish_refill(tier, enemies)
+    telemetry.inc("bestiary_added_total", added, tier=str(tier))
+
+bestiary = Bestiary(
+    os.getenv('bestiary_path', "bestiary.json"),
+    refill=lambda tier: threading.Thread(target=refill_bestiary, args=(tier,), daemon=True).start()
+)
+if not replaying:
+    bestiary.top_up(range(2))  # the first rooms' tiers, while the menu is up
+atexit.register(lambda: print("Bestiary:", bestiary.stats()))
 
-def generate_enemy():
-    combat_log.append("Summoning an enemy...")
-    render_and_flip(temp_room_text="Summoning an enemy...")
+def generate_enemy(room_count):
+    enemy = bestiary.draw(room_count)
+    if enemy is not None:
+        seen_enemies.add(enemy.name)
+        telemetry.inc("enemies_generated_total", site="enemy", source="bestiary")
+        return enemy
 
-    # Scale difficulty based on room count
-    min_hp = 20 + room_count * 2
-    max_hp = min(70, 30 + room_count * 4)
-    min_atk = 5 + room_count // 2
-    max_atk = min(25, 10 + room_count * 2)
+    ranges = enemy_stat_ranges(room_count)
+    min_hp, max_hp, min_atk, max_atk = ranges
 
     prompt = (
     f"Create a fantasy dungeon enemy for room {room_count}. "
@@ -171,75 +354,55 @@ def generate_enemy():
     '"special": {{"name": "Frost Bite", "effect": "freeze", "description": "The enemy bites with icy fangs!"}}}}'
 )
 
-    for _ in range(3):
-        response = safe_ask_gpt(prompt)
-        if response:
-            try:
-                enemy_data = json.loads(response)
-                if enemy_data["name"] not in seen_enemies:
-                    seen_enemies.add(enemy_data["name"])
-                    return Enemy(
-                        name=enemy_data["name"],
-                        description=enemy_data["description"],
-                        hp=enemy_data["hp"],
-                        atk=enemy_data["atk"],
-                        special=enemy_data.get("special")
-                    )
-            except json.JSONDecodeError:
-                continue
-    
-    if random.random() < 0.3:
-        effect = random.choice(["burn", "freeze"])
-        description = (
-            "The enemy channels flames to scorch you!" if effect == "burn"
-            else "The enemy conjures ice to freeze your limbs!"
-        )
-        special = {"name": effect.title(), "effect": effect, "description": description}
-    else:
-        special = None
+    for attempt in range(3):
+        # Retries go straight to GPT so a cached duplicate or broken reply isn't served again
+        if attempt:
+            telemetry.inc("gpt_retries_total", site="enemy", reason="invalid")
+        response = safe_ask_gpt(prompt, cached=attempt == 0, site="enemy", response_format=ENEMY_FORMAT)
+        if response is None:
+            break  # the API is failing, not just the reply
+        enemy = enemy_from_data(parse_lenient(response), ranges)
+        if enemy is None:
+            if response:
+                telemetry.inc("gpt_json_failures_total", site="enemy")
+            continue
+        if enemy.name not in seen_enemies:
+            seen_enemies.add(enemy.name)
+            bestiary.add(Bestiary.tier(room_count), [enemy], used=True)  # for later runs
+            telemetry.inc("enemies_generated_total", site="enemy", source="gpt")
+            return enemy
 
     # Fallback basic enemy
-    return Enemy(
-    name=enemy_data["name"],
-    description=enemy_data["description"],
-    hp=enemy_data["hp"],
-    atk=enemy_data["atk"],
-    special=special
-)
+    telemetry.inc("enemies_generated_total", site="enemy", source="local")
+    return local_content.enemy(room_count)
 
-def generate_boss():
-    combat_log.append("A powerful boss approaches...")
-    render_and_flip(temp_room_text="A powerful boss approaches...")
-
-    min_hp = 100 + room_count * 3
-    max_hp = 200 + room_count * 4
-    min_atk = 15 + room_count // 2
-    max_atk = 20 + room_count
+def generate_boss(room_count):
+    ranges = boss_stat_ranges(room_count)
+    min_hp, max_hp, min_atk, max_atk = ranges
 
     prompt = (
-        f"Create a fantasy dungeon boss for room {room_count}. "
+        f"Create a fantasy dungeon boss for room {room_count}, "
+        f"with HP ({min_hp}-{max_hp}), ATK ({min_atk}-{max_atk}) and a burn or freeze special ability. "
         f"Respond ONLY in JSON like:\n"
         '{"name": "", "description": "", "hp": 150, "atk": 20, '
         '"special": {"name": "Flame Burst", "effect": "burn", "description": "You are engulfed in fire!"}}'
     )
 
-    for _ in range(3):
-        response = safe_ask_gpt(prompt)
+    for attempt in range(3):
+        if attempt:
+            telemetry.inc("gpt_retries_total", site="boss", reason="invalid")
+        response = safe_ask_gpt(prompt, cached=attempt == 0, site="boss", response_format=ENEMY_FORMAT)
+        if response is None:
+            break
+        boss = enemy_from_data(parse_lenient(response), ranges, is_boss=True)
+        if boss is not None:
+            telemetry.inc("enemies_generated_total", site="boss", source="gpt")
+            return boss
         if response:
-            try:
-                data = json.loads(response)
-                return Enemy(
-                    name=data["name"],
-                    description=data["description"],
-                    hp=data["hp"],
-                    atk=data["atk"],
-                    special=data.get("special"),
-                    is_boss=True
-                )
-            except Exception:
-                continue
+            telemetry.inc("gpt_json_failures_total", site="boss")
 
     # fallback boss
+    telemetry.inc("enemies_generated_total", site="boss", source="local")
     return Enemy(
         name="Flame Wraith",
         description="A burning ghost with blazing eyes.",
@@ -248,184 +411,121 @@ def generate_boss():
         special={"name": "Flame Burst", "effect": "burn", "description": "You are engulfed in fire!"},
         is_boss=True
     )
-    in_combat = True
-
-
-def generate_quest():
-    combat_log.append("Generating a quest...")
-    render_and_flip(temp_room_text="Generating a quest...")
-    prompt = "Generate a fantasy dungeon quest for a player. Keep it short and exciting (1 sentence)."
-    return safe_ask_gpt(prompt)
-
-def loot_drop(player):
-    if random.random() < 0.5:
-        loot = random.choice(["Healing Potion", "Mysterious Pill", "Shield"])
-        player.inventory[loot] = player.inventory.get(loot, 0) + 1
-        return f"You found a {loot}!"
-    else:
-        gold_found = random.randint(5, 30)
-        player.gold += gold_found
-        return f"You found {gold_found} gold coins!"
-
-def random_event(player):
-    event = random.choice(["trap", "blessing"])
-    if event == "trap":
-        damage = random.randint(5, 15)
-        return player.take_damage(damage) + "\n A hidden trap springs!"
-    else:
-        heal = random.randint(5, 15)
-        return player.heal(heal) + "\n A magical aura surrounds you."
-
-def render_and_flip(temp_room_text=None):
-    screen.fill((0, 0, 30))
-    draw_text(screen, f"HP: {player.hp}    Gold: {player.gold}", 10, color=(255, 215, 0))
-    draw_text(screen, f"Room {room_count}", 40, color=(100, 200, 255))
-    draw_text(screen, temp_room_text if temp_room_text is not None else room_text, 80, line_spacing=FONT_SIZE + 8)
-    pygame.display.flip()
-
-def process_status_effects(player):
-    status_msgs = []
-    effects_to_remove = []
-
-    for effect, duration in player.status_effects.items():
-        if effect == "burn":
-            burn_dmg = 5
-            player.hp -= burn_dmg
-            status_msgs.append(f"You are burning! (-{burn_dmg} HP)")
-        elif effect == "freeze":
-            status_msgs.append("You are frozen and might skip your action!")
-        player.status_effects[effect] -= 1
-        if player.status_effects[effect] <= 0:
-            effects_to_remove.append(effect)
-
-    for effect in effects_to_remove:
-        del player.status_effects[effect]
-        status_msgs.append(f"The {effect} effect wears off.")
-
-    return status_msgs
-    
-
-# === Shop System ===
-shop_items = [
-    {"name": "Healing Potion", "cost": 10},
-    {"name": "Attack Buff", "cost": 25},
-    {"name": "Mysterious Pill", "cost": 15},
-    {"name": "Shield", "cost": 20}
-]
-
-def enter_shop(player):
-    item_descriptions = {
-        "Healing Potion": "Restores 20 HP",
-        "Attack Buff": "+5 ATK",
-        "Mysterious Pill": "???",
-        "Shield": "Grants 2 temporary blocks from damage"
-    }
-    items = []
-    for i, item in enumerate(shop_items):
-        name = item['name']
-        cost = item['cost']
-        desc = item_descriptions.get(name, "A mysterious item.")
-        label = f"[{i+1}] {name} - {cost} gold"
-        items.append((label, desc))
-
-    return items
-
-def enter_hp_shop(player):
-    return [
-        ("[1] Cursed Blade", "Trade 10 HP for +10 ATK"),
-        ("[2] Soul Shield", "Trade 8 HP for +4 blocks"),
-        ("[3] Blood Elixir", "Trade 15 HP for +40 HP"),
-        ("[4] Leave", "Walk away")
-    ]
 
-    # Each entry is (label, description, cost)
-    items = []
-    for i, item in enumerate(shop_items):
-        name = item['name']
-        cost = item['cost']
-        desc = item_descriptions.get(name, "A mysterious item.")
-        label = f"[{i+1}] {name} - {cost} gold"
-        items.append((label, desc))
 
-    return items
+def generate_room_batch(first_room, count):
+    # One completion describes `count` rooms and their regular enemies.
+    # Returns [(room_text, enemy), ...]; anything missing or unusable in the
+    # reply is filled in with the normal per-call generators.
+    rooms = list(range(first_room, first_room + count))
+    stat_lines = []
+    for number in rooms:
+        min_hp, max_hp, min_atk, max_atk = enemy_stat_ranges(number)
+        stat_lines.append(f"Room {number}: enemy HP {min_hp}-{max_hp}, ATK {min_atk}-{max_atk}.")
 
+    prompt = (
+        f"Create {count} consecutive fantasy dungeon rooms, numbered {rooms[0]} to {rooms[-1]}. "
+        f"For each room, describe it in 1-3 sentences with atmosphere, lighting, smells, and sounds, "
+        f"and create one enemy with a name, description, HP, ATK, and an optional special ability (burn or freeze). "
+        f"Keep every enemy inside its room's ranges:\n" + "\n".join(stat_lines) + "\n"
+        "Respond ONLY with a JSON array like:\n"
+        '[{"room": 1, "description": "", "enemy": {"name": "", "description": "", "hp": 50, "atk": 10, '
+        '"special": {"name": "Frost Bite", "effect": "freeze", "description": "The enemy bites with icy fangs!"}}}]'
+    )
 
-# === Item usage ===
-def use_item(player, item_name):
-    if player.inventory.get(item_name, 0) == 0:
-        return f"You have no {item_name} to use."
+    manifest = {}
+    response = safe_ask_gpt(prompt, max_tokens=200 * count, site="room_batch")
+    entries = parse_lenient(response)
+    if isinstance(entries, dict):
+        entries = entries.get("rooms")  # some models wrap the array in an object
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            manifest[int(entry["room"])] = entry
+        except (TypeError, KeyError, ValueError):
+            continue
+    if response and not manifest:
+        telemetry.inc("gpt_json_failures_total", site="room_batch")
+
+    results = []
+    for number in rooms:
+        entry = manifest.get(number)
+        room_text = entry.get("description") if entry else None
+        enemy = batch_enemy(entry.get("enemy"), number) if entry else None
+        results.append((room_text or generate_room(), enemy or generate_enemy(number)))
+    return results
+
+def batch_enemy(data, room_count):
+    enemy = enemy_from_data(data, enemy_stat_ranges(room_count))
+    if enemy is None or enemy.name in seen_enemies:
+        return None
+    seen_enemies.add(enemy.name)
+    telemetry.inc("enemies_generated_total", site="room_batch", source="gpt")
+    return enemy
 
-    # Reduce count
-    player.inventory[item_name] -= 1
-    if player.inventory[item_name] <= 0:
-        del player.inventory[item_name]
+def generate_quest():
+    prompt = "Generate a fantasy dungeon quest for a player. Keep it short and exciting (1 sentence)."
+    return safe_ask_gpt(prompt, site="quest")
+
+# === GPT Narration ===
+# The engine's content source for flavor text. Each line streams into the
+# combat log as it arrives, so nothing here is returned to the engine
+# except the pill placeholder.
+class GPTContent:
+    def boss_attack(self, enemy, damage):
+        gpt_prompt = (
+            f"Write a short, dramatic description (1–2 sentences) of a fantasy boss named '{enemy.name}' "
+            f"attacking the player and dealing {damage} damage. Make it vivid and action-packed."
+        )
+        stream_to_log(gpt_prompt, site="boss_flavor", context=memory.text)
 
-    if item_name == "Healing Potion":
-        heal_amount = 20
-        player.hp += heal_amount
-        return f"You use a Healing Potion and heal {heal_amount} HP."
-    
-    elif item_name == "Mysterious Pill":
-        result = random.choice(["good", "bad"])
-        effect = random.choice(["hp", "atk", "block"])
-
-        # Apply effect
-        effect_description = ""
-        if result == "good":
-            if effect == "hp":
-                amount = random.randint(10, 20)
-                player.hp += amount
-            elif effect == "atk":
-                player.atk_bonus += 5
-            elif effect == "block":
-                player.blocks_remaining += 2
-
-            # Ask GPT for a flavorful good effect description
-            combat_log.append("Interpreting the pill's effects...")
-            render_and_flip(temp_room_text="Interpreting the pill's effects...")
+    def pill_effect(self, good, effect):
+        if good:
             gpt_prompt = f"Write a short mysterious and magical-sounding description (1 sentence) of a GOOD effect from taking a fantasy pill that affects {effect}."
-            effect_description = safe_ask_gpt(gpt_prompt)
-
-        else:  # bad outcome
-            if effect == "hp":
-                amount = random.randint(5, 15)
-                player.hp -= amount
-            elif effect == "atk" and player.atk_bonus > 0:
-                player.atk_bonus -= 5
-            elif effect == "block" and player.blocks_remaining > 0:
-                player.blocks_remaining -= 1
-
-            # Ask GPT for a flavorful bad effect description
-            combat_log.append("Interpreting the pill's effects...")
-            render_and_flip(temp_room_text="Interpreting the pill's effects...")
+        else:
             gpt_prompt = f"Write a short disturbing or unsettling description (1 sentence) of a BAD effect from taking a fantasy pill that affects {effect}."
-            effect_description = safe_ask_gpt(gpt_prompt)
+        stream_to_log(gpt_prompt, fallback="Something strange happens.", site="pill", overlay=True)
+        return "Interpreting the pill's effects..."
 
-        return f"You swallow the Mysterious Pill...\n{effect_description or 'Something strange happens.'}"
-            
-            
-        
-    elif item_name == "Shield":
-        player.blocks_remaining += 2  # Stackable shield blocks
-        return f" You equip a Shield. Total blocks: {player.blocks_remaining}"
-    else:
-        return f"You try to use {item_name}, but nothing happens."
+    def death(self, room_number):
+        death_prompt = (
+            f"Write a short, dramatic fantasy-style death narration for a dungeon crawler who just died in room {room_number}. "
+            f"Make it vivid, somber, and 1–2 sentences long."
+        )
+        stream_to_log(death_prompt, fallback="You died in the dungeon, your journey ending in silence.", site="death",
+                      context=memory.text)
+        return None
 
 # === Pygame Setup ===
 pygame.init()
 pygame.mixer.init()
-purchase_sound = pygame.mixer.Sound("purchase.mp3")
-damage_sounds = [
-    pygame.mixer.Sound("damage.wav"),
-    pygame.mixer.Sound("damage2.wav"),
-    pygame.mixer.Sound("damage3.wav")
-    ]
-block_sound = pygame.mixer.Sound("block.wav")
+# All audio is served pre-decoded from one memory-mapped bundle, built from
+# these files on first run and whenever one of them changes
+assets = AssetBank(
+    os.getenv('asset_bundle', "assets.bundle"),
+    sounds={"purchase": "purchase.mp3", "damage": "damage.wav", "damage2": "damage2.wav",
+            "damage3": "damage3.wav", "block": "block.wav"},
+    music={"background": "background.wav", "game_over": "game_over.flac"}
+)
+sound_events = {"purchase": ["purchase"], "damage": ["damage", "damage2", "damage3"], "block": ["block"]}
+
+def load_sounds():
+    # Mapped on a background thread while the menu is up
+    assets.load()
+    mark_startup("sounds_ready")
+
+threading.Thread(target=load_sounds, daemon=True).start()
+
+def play_sound(event):
+    # Sound hook for the engine; silent until the bank has loaded
+    sound = assets.sound(random.choice(sound_events[event])) if event in sound_events else None
+    if sound:
+        sound.play()
 screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
 WIDTH, HEIGHT = screen.get_size()
 pygame.display.set_caption("AI Endless Dungeon")
 FONT_SIZE = max(18, int(HEIGHT * 0.025))
 FONT = pygame.font.SysFont("serif", FONT_SIZE)
+text_cache = TextLayoutCache(FONT)
 
 # === UI Elements ===
 SHOP_BTN_RECT = pygame.Rect(WIDTH - 360, 20, 150, 40) 
@@ -439,47 +539,30 @@ RESTART_BTN_RECT = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2, 200, 60)
 def draw_text(surface, text, y, color=(255, 255, 255), line_spacing=30, max_width=None):
     if max_width is None:
         max_width = WIDTH - 60
-    words = text.split(' ')
-    lines = []
-    line = ""
-    for word in words:
-        test_line = line + word + " "
-        if FONT.size(test_line)[0] < max_width:
-            line = test_line
-        else:
-            lines.append(line.strip())
-            line = word + " "
-    lines.append(line.strip())
+    for rendered, dy in text_cache.layout(text, color, max_width, line_spacing):
+        surface.blit(rendered, (30, y + dy))
 
-    for i, line in enumerate(lines):
-        rendered = FONT.render(line, True, color)
-        surface.blit(rendered, (30, y + i * line_spacing))
+def render_line(text, color=(255, 255, 255)):
+    # A single unwrapped line, from the layout cache
+    return text_cache.layout(text, color)[0][0]
 
 def draw_text_centered(surface, text, rect, color=(255, 255, 255)):
-    rendered = FONT.render(text, True, color)
+    rendered = render_line(text, color)
     text_rect = rendered.get_rect(center=rect.center)
     surface.blit(rendered, text_rect)
 
 def draw_prompt_text(surface, text, y_offset=20, color=(200, 200, 200)):
-    rendered = FONT.render(text, True, color)
+    rendered = render_line(text, color)
     surface.blit(rendered, (30, HEIGHT - y_offset))
 
 # === Game State ===
-player = Player()
-enemy = None
-combat_log = []
-room_count = 1
-special_attack_last_used_room = -4 
-room_text = generate_room()
-quest_text = generate_quest()
-combat_log = [" Quest: " + quest_text]
-game_over = False
-in_combat = False
+# The rules and run state live in the engine; everything below is UI state
+game = Game(rng=random, content=GPTContent(), notify=play_sound)
+loading_text = None  # shown instead of room_text while content is generating
+room_stream = None  # the loading room's description as it streams in
 shop_mode = False
 inventory_mode = False
 game_over_music_playing = False
-post_boss_shop = False
-is_hp_shop = False  
 shop_display_lines = []
 
 previous_combat_log = []
@@ -488,18 +571,244 @@ previous_room_text = ""
 previous_combat_log_inv = []
 previous_room_text_inv = ""
 
+# === Perceived Latency ===
+# How long the player waits after a key press: until the next room can be
+# played, and until a combat turn's narration starts to appear (turns without
+# narration count as no wait)
+perceived_waits = {"room": [], "turn": []}
+action_started = None  # (kind, start time) of the key press being handled
+room_requested_at = 0.0
+
+def record_wait(kind, started):
+    waited = time.perf_counter() - started
+    perceived_waits[kind].append(waited)
+    telemetry.observe("perceived_wait_seconds", waited, kind=kind)
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def report_perceived_waits():
+    for kind, waits in perceived_waits.items():
+        if waits:
+            print(f"Perceived wait per {kind}: p50 {percentile(waits, 0.5) * 1000:.0f} ms, "
+                  f"p95 {percentile(waits, 0.95) * 1000:.0f} ms, max {max(waits) * 1000:.0f} ms ({len(waits)} samples)")
+
+atexit.register(report_perceived_waits)
+
+# === Async Content ===
+def run_log():
+    # The run's own log; shop and inventory overlays cover it with theirs
+    return previous_combat_log if shop_mode else previous_combat_log_inv if inventory_mode else game.combat_log
+
+def append_to_log(text, room, overlay=False):
+    # Late flavor text for a room the player already left is dropped. Overlay
+    # text (a pill used from the inventory) shows in the inventory while it's
+    # open, and in the run's log once it's closed.
+    if text and room == game.room_count:
+        (game.combat_log if overlay and inventory_mode else run_log()).append(text)
+
+def stream_to_log(prompt, fallback=None, site="other", context=None, overlay=False):
+    # The line is added to the log with its first tokens and fills in from there
+    global action_started
+    room = game.room_count
+    waiting, action_started = action_started, None
+
+    def on_start(line):
+        append_to_log(line, room, overlay)
+        if waiting:
+            record_wait(*waiting)
+
+    def on_done(text):
+        if not text and fallback:
+            append_to_log(fallback, room, overlay)
+            if waiting:
+                record_wait(*waiting)
+
+    llm.stream(prompt, on_start=on_start, callback=on_done, site=site, context=context)
+
+def start_new_run():
+    global loading_text, room_stream
+    llm.invalidate()
+    prefetcher.reset()
+    room_batches.clear()
+    bestiary.new_run()
+    memory.reset()
+    api_stats["rooms"] += 1
+    game.reset()
+    loading_text = "Generating room description..."
+    game.combat_log = ["Generating a quest..."]
+    room_stream = StreamBuffer()
+    room_future = llm.submit_call(generate_room, room_stream)
+    quest_future = llm.submit_call(generate_quest)
+    llm.when_all([room_future, quest_future], on_run_ready)
+    prefetcher.fill(game.room_count)
+
+def on_run_ready(new_room_text, quest_text):
+    global loading_text, room_stream
+    mark_startup("first_room_ready")
+    loading_text = None
+    room_stream = None
+    game.start(new_room_text, quest_text)
+    memory.reset(quest_text)
+
+# With batch_rooms > 1, room text and regular enemies come from one request
+# per batch_rooms rooms instead of one or more requests per room
+BATCH_ROOMS = int(os.getenv('batch_rooms', 1))
+room_batches = {}  # room number -> future of (room_text, enemy)
+
+def batch_entry(room_number):
+    if room_number not in room_batches:
+        batch = llm.submit_call(generate_room_batch, room_number, BATCH_ROOMS)
+        for i in range(BATCH_ROOMS):
+            room_batches[room_number + i] = llm.derive(batch, lambda rooms, i=i: rooms[i])
+    return room_batches.pop(room_number)
+
+def plan_room(room_number):
+    # Roll everything about the room up front so it can be generated ahead of time
+    golden, is_boss, spawn = game.roll_room(room_number)
+    if golden:
+        return RoomPlan(room_number, golden=True)
+    stream = None
+    if BATCH_ROOMS > 1:
+        entry = batch_entry(room_number)
+        futures = [llm.derive(entry, lambda room: room[0])]
+        if is_boss:
+            futures.append(llm.submit_call(generate_boss, room_number))
+        elif spawn:
+            futures.append(llm.derive(entry, lambda room: room[1]))
+    else:
+        stream = StreamBuffer()
+        futures = [llm.submit_call(generate_room, stream)]
+        if is_boss:
+            futures.append(llm.submit_call(generate_boss, room_number))
+        elif spawn:
+            futures.append(llm.submit_call(generate_enemy, room_number))
+    return RoomPlan(room_number, is_boss=is_boss, spawn=spawn, futures=futures, stream=stream)
+
+def report_requests_per_room():
+    rooms = max(1, api_stats["rooms"])
+    print(f"GPT requests: {api_stats['requests']} for {api_stats['rooms']} rooms "
+          f"({api_stats['requests'] / rooms:.2f} per room, batch_rooms={BATCH_ROOMS})")
+
+atexit.register(report_requests_per_room)
+
+def report_calls_per_enemy():
+    # API calls (cache hits excluded) per enemy or boss created
+    for site in ("enemy", "boss"):
+        made = telemetry.total("enemies_generated_total", site=site)
+        if made:
+            calls = telemetry.total("gpt_calls_total", site=site, outcome="ok") + \
+                telemetry.total("gpt_calls_total", site=site, outcome="error")
+            local = telemetry.total("enemies_generated_total", site=site, source="local")
+            print(f"GPT calls per {site}: {calls / made:.2f} ({calls} calls, {made} made, {local} local fallbacks)")
+
+atexit.register(report_calls_per_enemy)
+
+prefetcher = RoomPrefetcher(plan_room, depth=int(os.getenv('prefetch_rooms', 2)))
+atexit.register(lambda: print("Room prefetch:", prefetcher.stats()))
+
+def advance_room():
+    global loading_text, room_stream, room_requested_at
+    room_requested_at = time.perf_counter()
+    game.room_count += 1
+    api_stats["rooms"] += 1
+    plan = prefetcher.pop(game.room_count)
+    if plan.golden:
+        game.enter_room(True)
+        remember_room(golden=True)
+        record_wait("room", room_requested_at)
+        autosave_run()
+    elif llm.ready(plan.futures):
+        on_room_ready(*[llm.result(f) for f in plan.futures])
+    else:
+        if plan.is_boss:
+            loading_text = "A powerful boss approaches..."
+        elif plan.spawn:
+            loading_text = "Summoning an enemy..."
+        else:
+            loading_text = "Generating room description..."
+        room_stream = plan.stream
+        llm.when_all(plan.futures, on_room_ready)
+    # Start on the rooms after this one while the player reads
+    prefetcher.fill(game.room_count)
+
+def on_room_ready(new_room_text, new_enemy=None):
+    global loading_text, room_stream
+    loading_text = None
+    room_stream = None
+    record_wait("room", room_requested_at)
+    game.enter_room(False, new_room_text, new_enemy)
+    remember_room(enemy=new_enemy)
+    check_death()
+    autosave_run()
+
+def check_death():
+    global game_over_music_playing
+    if not game.check_death():
+        return
+    autosave.delete()
+
+    if not game_over_music_playing:
+        assets.play_music("game_over")  # Your game over music
+        game_over_music_playing = True
+
+# === Save / Resume ===
+# A snapshot after every room, written by a background thread; the menu
+# offers to continue from it, with no GPT calls needed to rebuild the room
+autosave = AutoSaver(os.getenv('save_path', "savegame.dat"))
+
+def autosave_run():
+    if game.game_over or loading_text:
+        return  # nothing worth resuming, or the room isn't there yet
+    started = time.perf_counter()
+    autosave.save(encode_snapshot(game, seen_enemies, run_log()))
+    telemetry.observe("save_seconds", time.perf_counter() - started, op="encode")
+
+def resume_run(data):
+    global loading_text, room_stream, shop_display_lines
+    started = time.perf_counter()
+    llm.invalidate()
+    prefetcher.reset()
+    room_batches.clear()
+    try:
+        names = restore_snapshot(game, data)
+    except ValueError as e:
+        print("Could not resume the saved run:", e)
+        start_new_run()
+        return
+    seen_enemies.clear()
+    seen_enemies.update(names)
+    bestiary.new_run(exclude=seen_enemies)
+    memory.reset()  # saves don't keep it; it builds up again from here
+    if game.post_boss_shop:
+        shop_display_lines = enter_hp_shop(game.player)  # saved on the way out of a boss fight
+    loading_text = None
+    room_stream = None
+    prefetcher.fill(game.room_count)
+    telemetry.observe("save_seconds", time.perf_counter() - started, op="resume")
+
 # === Game Loop ===
-def start_menu():
-    pygame.mixer.music.load("background.wav")
+def read_events(first=None):
+    # This frame's input, through the trace when there is one
+    events = pygame.event.get()
+    if first is not None and first.type != pygame.NOEVENT:
+        events.insert(0, first)
+    return trace.events(events) if trace is not None else events
+
+def start_menu(can_continue=False):
+    # Returns "continue" to resume the saved run, otherwise "new"
     pygame.mixer.music.set_volume(0.5)  # Volume from 0.0 to 1.0
-    pygame.mixer.music.play(-1)  # -1 means loop forever
+    assets.play_music("background")  # loops forever
     
     menu_running = True
     title_font = pygame.font.SysFont("serif", int(FONT_SIZE * 2))
     small_font = pygame.font.SysFont("serif", FONT_SIZE)
 
+    continue_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 - 120, 200, 50)
     start_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 - 50, 200, 50)
     quit_button = pygame.Rect(WIDTH // 2 - 100, HEIGHT // 2 + 20, 200, 50)
+    choice = "new"
 
     while menu_running:
         screen.fill((10, 10, 40))
@@ -510,335 +819,330 @@ def start_menu():
         screen.blit(title_surf, title_rect)
 
         # Draw buttons
+        if can_continue:
+            pygame.draw.rect(screen, (70, 160, 110), continue_button)
+            draw_text_centered(screen, "Continue", continue_button)
+
         pygame.draw.rect(screen, (70, 130, 180), start_button)
         draw_text_centered(screen, "Start Game", start_button)
 
         pygame.draw.rect(screen, (180, 70, 70), quit_button)
         draw_text_centered(screen, "Quit", quit_button)
 
+        assets.poll()
+
         # Event handling
-        for event in pygame.event.get():
+        for event in read_events():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if start_button.collidepoint(event.pos):
+                if can_continue and continue_button.collidepoint(event.pos):
+                    choice = "continue"
+                    menu_running = False
+                elif start_button.collidepoint(event.pos):
                     menu_running = False
                 elif quit_button.collidepoint(event.pos):
                     pygame.quit()
                     sys.exit()
 
         pygame.display.flip()
-        clock.tick(60)
+        mark_startup("first_frame")
+        if not replaying:
+            clock.tick(60)
+
+    return choice
+
+# === Drawing ===
+# Screen regions that can change independently, for partial display updates
+HUD_RECT = pygame.Rect(0, 0, WIDTH, 75)
+ROOM_RECT = pygame.Rect(0, 75, WIDTH, 175)
+PANE_RECT = pygame.Rect(0, 140, WIDTH, HEIGHT - 140)
+
+def shown_room_text():
+    if loading_text:
+        # Show the description as it streams in, or the placeholder until it starts
+        return str(room_stream or "") or loading_text
+    return game.room_text or ""
+
+def frame_state():
+    # What each region shows; a region is redrawn only when this changes
+    return [
+        (HUD_RECT, (game.player.hp, game.player.gold, game.room_count)),
+        (ROOM_RECT, (shown_room_text(), shop_mode)),  # the Close Shop button sits in it
+        (PANE_RECT, (shop_mode, inventory_mode, game.post_boss_shop, game.game_over, game.in_combat, game.player.gold,
+                     game.combat_log.tail(12))),
+    ]
 
-clock = pygame.time.Clock()
+def draw_frame():
+    screen.fill((0, 0, 30))
+    draw_text(screen, f"HP: {game.player.hp}    Gold: {game.player.gold}", 10, color=(255, 215, 0))
+    draw_text(screen, f"Room {game.room_count}", 40, color=(100, 200, 255))
+    draw_text(screen, shown_room_text(), 80, line_spacing=FONT_SIZE + 8)
 
-start_menu()
+    # Draw buttons
+    pygame.draw.rect(screen, (70, 130, 180), SHOP_BTN_RECT)
+    draw_text_centered(screen, "Open Shop", SHOP_BTN_RECT)
+
+    pygame.draw.rect(screen, (70, 180, 130), INVENTORY_BTN_RECT)
+    draw_text_centered(screen, "Inventory", INVENTORY_BTN_RECT)
+
+    if shop_mode:
+        pygame.draw.rect(screen, (20, 20, 50), pygame.Rect(20, 140, WIDTH - 40, HEIGHT - 260))
+
+        # Title
+        draw_text(screen, "Welcome to the Dungeon Shop!", 150)
+        draw_text(screen, f"You have {game.player.gold} gold.", 180)
+
+        # Shop items in columns
+        col_width = WIDTH // 2
+        x_offsets = [40, col_width + 20]  # Left and right columns
+        y_start = 220
+        y_spacing = FONT_SIZE * 3
+
+        for i, (label, desc) in enumerate(shop_display_lines):
+            col = i % 2
+            row = i // 2
+            x = x_offsets[col]
+            y = y_start + row * y_spacing
+
+            label_surf = render_line(label, (255, 255, 255))
+            desc_surf = render_line(f"➤ {desc}", (180, 180, 180))
+
+            screen.blit(label_surf, (x, y))
+            screen.blit(desc_surf, (x + 20, y + FONT_SIZE))
+
+        # Close button
+        pygame.draw.rect(screen, (180, 70, 70), CLOSE_BTN_RECT)
+        draw_text_centered(screen, "Close Shop", CLOSE_BTN_RECT)
+
+    elif inventory_mode:
+        pygame.draw.rect(screen, (20, 20, 50), pygame.Rect(20, 140, WIDTH - 40, HEIGHT - 260))
+        draw_text(screen, game.combat_log.tail(12), 160, line_spacing=FONT_SIZE + 6)
+
+        pygame.draw.rect(screen, (70, 180, 130), INV_CLOSE_BTN_RECT)
+        draw_text_centered(screen, "Close Inv.", INV_CLOSE_BTN_RECT)
+
+    elif game.post_boss_shop:
+        pygame.draw.rect(screen, (30, 10, 40), pygame.Rect(20, 140, WIDTH - 40, HEIGHT - 260))
+        draw_text(screen, "Shadowy Shopkeeper:", 160)
+        draw_text(screen, "Trade HP for powerful artifacts...", 200)
+
+        y_offset = 240
+        for label, desc in shop_display_lines:
+            draw_text(screen, f"{label}  ➤ {desc}", y_offset)
+            y_offset += FONT_SIZE * 2
+
+    else:
+        draw_text(screen, game.combat_log.tail(6), 250, line_spacing=FONT_SIZE + 6)
+
+    if game.game_over:
+        draw_text(screen, "GAME OVER - Press [X] To Quit", HEIGHT - 60, color=(255, 100, 100))
+
+        pygame.draw.rect(screen, (50, 150, 50), RESTART_BTN_RECT)
+        draw_text_centered(screen, "Restart Game", RESTART_BTN_RECT)
+
+    elif game.in_combat and not shop_mode and not inventory_mode:
+        draw_prompt_text(screen, "Press [A] to attack, [S] for special, or [R] to run", y_offset=40)
+    elif not game.in_combat and not shop_mode and not inventory_mode and not game.game_over:
+        draw_prompt_text(screen, "Press any key to continue...", y_offset=40)
+
+clock = pygame.time.Clock()
+FPS = int(os.getenv('fps', 60))
+IDLE_WAIT_MS = int(os.getenv('idle_wait_ms', 250))
+
+# The first room and quest generate in the background while the menu is up
+saved_run = autosave.load()
+if trace is not None:
+    saved_run = trace.save_data(saved_run)
+if saved_run is None:
+    start_new_run()  # the first room generates while the menu is up
+if start_menu(can_continue=saved_run is not None) == "continue":
+    resume_run(saved_run)
+elif saved_run is not None:
+    start_new_run()
+
+last_frame_state = None
+full_redraw = True
+idle_event = None
 
 while True:
-    screen.fill((0, 0, 30))
+    frame_started = time.perf_counter()
+    # Apply any GPT results that finished since the last frame
+    llm.poll()
+    assets.poll()
 
     # === Event Handling ===
-    for event in pygame.event.get():
+    events = read_events(idle_event)
+    idle_event = None
+
+    events_started = time.perf_counter()
+    for event in events:
         if event.type == pygame.QUIT:
+            autosave_run()
+            autosave.flush()
             pygame.quit()
             sys.exit()
 
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            full_redraw = True
+
         elif event.type == pygame.MOUSEBUTTONDOWN:
-            mouse_pos = pygame.mouse.get_pos()
+            mouse_pos = event.pos
             
-            if game_over and RESTART_BTN_RECT.collidepoint(mouse_pos):
+            if game.game_over and RESTART_BTN_RECT.collidepoint(mouse_pos):
                 # Reset all game state variables
-                player = Player()
-                enemy = None
-                combat_log.clear()
-                room_count = 1
-                room_text = generate_room()
-                quest_text = generate_quest()
-                combat_log = [" Quest: " + quest_text]
-                game_over = False
-                in_combat = False
+                start_new_run()
                 shop_mode = False
                 inventory_mode = False
                 game_over_music_playing = False
-                pygame.mixer.music.stop()
-                pygame.mixer.music.load("background.wav")
-                pygame.mixer.music.play(-1)
+                assets.play_music("background")
 
 
-            if SHOP_BTN_RECT.collidepoint(mouse_pos) and not shop_mode and not inventory_mode:
+            if loading_text:
+                pass  # the room is still generating; shop and inventory wait for it
+            elif SHOP_BTN_RECT.collidepoint(mouse_pos) and not shop_mode and not inventory_mode:
                 shop_mode = True
-                previous_combat_log = combat_log[:]
-                previous_room_text = room_text
-                shop_display_lines = enter_shop(player)  # <-- only store display info
-                combat_log = ["Welcome to the Dungeon Shop!", f"You have {player.gold} gold."]
+                previous_combat_log = game.combat_log  # kept aside, not copied: the overlay gets a log of its own
+                previous_room_text = game.room_text
+                shop_display_lines = enter_shop(game.player)  # <-- only store display info
+                game.combat_log = ["Welcome to the Dungeon Shop!", f"You have {game.player.gold} gold."]
             elif INVENTORY_BTN_RECT.collidepoint(mouse_pos) and not inventory_mode and not shop_mode:
                 inventory_mode = True
-                previous_combat_log_inv = combat_log[:]
-                previous_room_text_inv = room_text
-                if player.inventory:
-                    combat_log = ["Inventory:"]
-                    for i, (item, count) in enumerate(player.inventory.items()):
+                previous_combat_log_inv = game.combat_log
+                previous_room_text_inv = game.room_text
+                if game.player.inventory:
+                    game.combat_log = ["Inventory:"]
+                    for i, (item, count) in enumerate(game.player.inventory.items()):
                         label = f"{item} x{count}" if count > 1 else item
-                        combat_log.append(f"[{i+1}] {label}")
+                        game.combat_log.append(f"[{i+1}] {label}")
                 else:
-                    combat_log = ["Inventory is empty."]
+                    game.combat_log = ["Inventory is empty."]
             elif CLOSE_BTN_RECT.collidepoint(mouse_pos) and shop_mode:
                 shop_mode = False
-                combat_log = previous_combat_log[:]
-                room_text = previous_room_text
+                game.combat_log = previous_combat_log
+                game.room_text = previous_room_text
             elif INV_CLOSE_BTN_RECT.collidepoint(mouse_pos) and inventory_mode:
                 inventory_mode = False
-                combat_log = previous_combat_log_inv[:]
-                room_text = previous_room_text_inv
+                game.combat_log = previous_combat_log_inv
+                game.room_text = previous_room_text_inv
 
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_F11:
                 pygame.display.toggle_fullscreen()
+                full_redraw = True
 
-            if game_over:
+            if game.game_over:
                 if event.key == pygame.K_x:
                     pygame.quit()
                     sys.exit()
                 continue
 
+            fighting = game.enemy if game.in_combat else None
+
             if shop_mode:
                 if event.key in [pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4]:
                     index = event.key - pygame.K_1
-                    if 0 <= index < len(shop_items):
-                        item = shop_items[index]
-                        result = player.buy(item['name'], item['cost'])
-                        combat_log.append(result)
-                        if "You bought" in result:
-                          purchase_sound.play()
+                    result = game.buy(index)
+                    if result:
+                        game.combat_log.append(result)
                 elif event.key == pygame.K_ESCAPE:
                     shop_mode = False
-                    combat_log = previous_combat_log[:]
-                    room_text = previous_room_text
-                    combat_log.append("You exit the shop.")
+                    game.combat_log = previous_combat_log
+                    game.room_text = previous_room_text
+                    game.combat_log.append("You exit the shop.")
 
             elif inventory_mode:
                 if event.key in [pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4, pygame.K_5, pygame.K_6, pygame.K_7, pygame.K_8, pygame.K_9]:
                     idx = event.key - pygame.K_1
-                    inventory_keys = list(player.inventory.keys())
+                    inventory_keys = list(game.player.inventory.keys())
                     if 0 <= idx < len(inventory_keys):
                         item_name = inventory_keys[idx]
-                        result = use_item(player, item_name)
+                        result = game.use_item(item_name)
                         new_log = [result]
                         
-                        if player.inventory:
+                        if game.player.inventory:
                             new_log.append("Inventory:")
-                            for i, (item, count) in enumerate(player.inventory.items()):
+                            for i, (item, count) in enumerate(game.player.inventory.items()):
                                 label = f"{item} x{count}" if count > 1 else item
                                 new_log.append(f"[{i+1}] {label}")
                         else:
                             new_log.append("Inventory is empty.")
 
-                        combat_log = new_log
+                        game.combat_log = new_log
                 
                 elif event.key == pygame.K_ESCAPE:
                     inventory_mode = False
-                    combat_log = previous_combat_log_inv[:]
-                    room_text = previous_room_text_inv
-                    combat_log.append("You close the inventory.")
+                    game.combat_log = previous_combat_log_inv
+                    game.room_text = previous_room_text_inv
+                    game.combat_log.append("You close the inventory.")
             
-            elif post_boss_shop:
-                if event.key == pygame.K_1:
-                    if player.hp > 10:
-                        player.hp -= 10
-                        player.atk_bonus += 10
-                        combat_log = ["You grasp the Cursed Blade. Power surges through your veins."]
-                    else:
-                        combat_log = ["You don't have enough HP for the Cursed Blade."]
-                    post_boss_shop = False
-                elif event.key == pygame.K_2:
-                    if player.hp > 8:
-                        player.hp -= 8
-                        player.blocks_remaining += 4
-                        combat_log = ["The Soul Shield binds to your aura. You feel protected."]
-                    else:
-                        combat_log = ["Not enough HP for the Soul Shield."]
-                    post_boss_shop = False
-                elif event.key == pygame.K_3:
-                    if player.hp > 15:
-                        player.hp -= 15
-                        player.hp += 40
-                        combat_log = ["You drink the Blood Elixir. It burns... then heals."]
-                    else:
-                        combat_log = ["Too little HP to survive the Blood Elixir."]
-                    post_boss_shop = False
-                elif event.key == pygame.K_4 or event.key == pygame.K_ESCAPE:
-                    combat_log = ["You nod to the shopkeeper and walk on."]
-                    post_boss_shop = False
-
-            elif not in_combat and not shop_mode and not inventory_mode:
-                room_count += 1
-                if random.random() < 0.1:
-                    room_text = "You find a Golden Room! The walls gleam with treasure!"
-                    player.gold += 50
-                    combat_log = ["You found a hidden cache and gained 50 gold!"]
-                else:
-                    room_text = generate_room()
-                    if room_count % 10 == 0:
-                        enemy = generate_boss()
-                        combat_log = [f"⚔️ BOSS ENCOUNTER: {enemy.name} ⚔️",
-                                    f"{enemy.description} (HP: {enemy.hp}, ATK: {enemy.atk})"]
-                        in_combat = True
-                    else:
-                        if random.random() < 0.7:
-                            enemy = generate_enemy()
-                            combat_log = [f"You encounter: {enemy.name}",
-                                        f"{enemy.description} (HP: {enemy.hp}, ATK: {enemy.atk})"]
-                            in_combat = True
-                        else:
-                            combat_log = [random_event(player)]
+            elif game.post_boss_shop:
+                if event.key in [pygame.K_1, pygame.K_2, pygame.K_3, pygame.K_4]:
+                    game.hp_shop(event.key - pygame.K_1 + 1)
+                elif event.key == pygame.K_ESCAPE:
+                    game.hp_shop(4)
+
+            elif loading_text:
+                continue  # still waiting on GPT for this room
+
+            elif not game.in_combat and not shop_mode and not inventory_mode:
+                advance_room()
                
                     
             else:
-                if in_combat and event.key in [pygame.K_a, pygame.K_s]:
-                    status_msgs = process_status_effects(player)
-
-                    if "freeze" in player.status_effects:
-                        combat_log = status_msgs + ["You're frozen and skip this turn!"]
-                        continue
-
-                    if event.key == pygame.K_a:
-                        combat_log = status_msgs + [player.attack(enemy)]
-                    elif event.key == pygame.K_s:
-                        if room_count - special_attack_last_used_room >= 4:
-                            effect = random.choice(["burn", "freeze"])
-                            combat_log = status_msgs + [player.special_attack(enemy, effect)]
-                            special_attack_last_used_room = room_count
-                        else:
-                            turns_left = 4 - (room_count - special_attack_last_used_room)
-                            combat_log = status_msgs + [f"Special attack not ready! {turns_left} more room(s) needed "]
-
-                    if enemy.hp > 0:
-                        combat_log.append(enemy.attack(player))
-                    else:
-                        combat_log.append(loot_drop(player))
-                        if enemy.is_boss:
-                            post_boss_shop = True
-                            shop_mode = True
-                            is_hp_shop = True
-                            previous_combat_log = combat_log[:]
-                            previous_room_text = room_text
-                            shop_display_lines = enter_hp_shop(player)
-                            combat_log = ["A shadowy shopkeeper appears...", "Trade your health for power."]
-                        in_combat = False
+                if game.in_combat and event.key in [pygame.K_a, pygame.K_s]:
+                    action_started = ("turn", time.perf_counter())
+                    game.combat_turn("attack" if event.key == pygame.K_a else "special")
+                    if action_started:
+                        record_wait(*action_started)  # nothing to narrate, the result is already shown
+                        action_started = None
+                    if game.post_boss_shop:
+                        shop_display_lines = enter_hp_shop(game.player)
             
-            if player.hp <= 0:
-                game_over = True
-                combat_log.append("Game over...")
-                render_and_flip(temp_room_text="Game over...")
-                
-                # Ask GPT for a dramatic death message
-                death_prompt = (
-                    f"Write a short, dramatic fantasy-style death narration for a dungeon crawler who just died in room {room_count}. "
-                    f"Make it vivid, somber, and 1–2 sentences long."
-                )
-                try:
-                    death_text = safe_ask_gpt(death_prompt)
-                except:
-                    death_text = "You died in the dungeon, your journey ending in silence."
-
-                combat_log.append(death_text)
-
-                if not game_over_music_playing:
-                    pygame.mixer.music.stop()
-                    pygame.mixer.music.load("game_over.flac")  # Your game over music
-                    pygame.mixer.music.play(-1)
-                    game_over_music_playing = True
+            check_death()
             
             
 
-            if game_over and event.key == pygame.K_x:
+            if game.game_over and event.key == pygame.K_x:
                 pygame.quit()
                 sys.exit()
             
-            elif event.key == pygame.K_r and in_combat:
-                # Try to run from combat with 50% success chance
-                if random.random() < 0.5:
-                    combat_log.append("You successfully ran away!")
-                    in_combat = False
-                else:
-                    combat_log.append("You failed to escape!")
-                    combat_log.append(enemy.attack(player))
-        
-
-    # === Draw UI ===
-    draw_text(screen, f"HP: {player.hp}    Gold: {player.gold}", 10, color=(255, 215, 0))
-    draw_text(screen, f"Room {room_count}", 40, color=(100, 200, 255))
-    draw_text(screen, room_text or "", 80, line_spacing=FONT_SIZE + 8)
-
-    # Draw buttons
-    pygame.draw.rect(screen, (70, 130, 180), SHOP_BTN_RECT)
-    draw_text_centered(screen, "Open Shop", SHOP_BTN_RECT)
-
-    pygame.draw.rect(screen, (70, 180, 130), INVENTORY_BTN_RECT)
-    draw_text_centered(screen, "Inventory", INVENTORY_BTN_RECT)
+            elif event.key == pygame.K_r and game.in_combat:
+                game.run_away()
+                check_death()
 
-    if shop_mode:
-        pygame.draw.rect(screen, (20, 20, 50), pygame.Rect(20, 140, WIDTH - 40, HEIGHT - 260))
-
-        # Title
-        draw_text(screen, "Welcome to the Dungeon Shop!", 150)
-        draw_text(screen, f"You have {player.gold} gold.", 180)
-
-        # Shop items in columns
-        col_width = WIDTH // 2
-        x_offsets = [40, col_width + 20]  # Left and right columns
-        y_start = 220
-        y_spacing = FONT_SIZE * 3
-
-        for i, (label, desc) in enumerate(shop_display_lines):
-            col = i % 2
-            row = i // 2
-            x = x_offsets[col]
-            y = y_start + row * y_spacing
-
-            label_surf = FONT.render(label, True, (255, 255, 255))
-            desc_surf = FONT.render(f"➤ {desc}", True, (180, 180, 180))
-
-            screen.blit(label_surf, (x, y))
-            screen.blit(desc_surf, (x + 20, y + FONT_SIZE))
-
-        # Close button
-        pygame.draw.rect(screen, (180, 70, 70), CLOSE_BTN_RECT)
-        draw_text_centered(screen, "Close Shop", CLOSE_BTN_RECT)
-
-    elif inventory_mode:
-        pygame.draw.rect(screen, (20, 20, 50), pygame.Rect(20, 140, WIDTH - 40, HEIGHT - 260))
-        draw_text(screen, "\n".join(combat_log[-12:]), 160, line_spacing=FONT_SIZE + 6)
-
-        pygame.draw.rect(screen, (70, 180, 130), INV_CLOSE_BTN_RECT)
-        draw_text_centered(screen, "Close Inv.", INV_CLOSE_BTN_RECT)
-
-    elif post_boss_shop:
-        pygame.draw.rect(screen, (30, 10, 40), pygame.Rect(20, 140, WIDTH - 40, HEIGHT - 260))
-        draw_text(screen, "Shadowy Shopkeeper:", 160)
-        draw_text(screen, "Trade HP for powerful artifacts...", 200)
+            if fighting is not None and not game.in_combat:
+                memory.fight_over(fighting, won=fighting.hp <= 0)
+        
 
-        hp_shop_lines = enter_hp_shop(player)
-        y_offset = 240
-        for label, desc in hp_shop_lines:
-            draw_text(screen, f"{label}  ➤ {desc}", y_offset)
-            y_offset += FONT_SIZE * 2
+    if events:
+        telemetry.observe("event_seconds", time.perf_counter() - events_started)
 
+    # === Draw UI ===
+    # Redraw only when something on screen changed, and only push the
+    # regions that changed to the display
+    state = frame_state()
+    if full_redraw:
+        dirty = [rect for rect, _ in state]
     else:
-        draw_text(screen, "\n".join(str(line) for line in combat_log[-6:] if line is not None), 250, line_spacing=FONT_SIZE + 6)
-
-    if game_over:
-        draw_text(screen, "GAME OVER - Press [X] To Quit", HEIGHT - 60, color=(255, 100, 100))
-
-        pygame.draw.rect(screen, (50, 150, 50), RESTART_BTN_RECT)
-        draw_text_centered(screen, "Restart Game", RESTART_BTN_RECT)
-    
-    elif in_combat and not shop_mode and not inventory_mode:
-        draw_prompt_text(screen, "Press [A] to attack, [S] for special, or [R] to run", y_offset=40)
-    elif not in_combat and not shop_mode and not inventory_mode and not game_over:
-        draw_prompt_text(screen, "Press any key to continue...", y_offset=40)
-
-    pygame.display.flip()
-    clock.tick(60)
\ No newline at end of file
+        dirty = [rect for (rect, shown), (_, before) in zip(state, last_frame_state) if shown != before]
+    if dirty:
+        draw_frame()
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+    last_frame_state = state
+    full_redraw = False
+    telemetry.observe("frame_seconds", time.perf_counter() - frame_started)
+
+    if replaying:
+        pass  # as fast as it goes
+    elif dirty or events or llm.busy():
+        clock.tick(FPS)
+    else:
+        # Nothing is happening: sleep until the next input instead of spinning
+        idle_event = pygame.event.wait(IDLE_WAIT_MS)
+        clock.tick()
\ No newline at end of file
@@ -0,0 +1,237 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from engine import EFFECTS, EFFECT_INDEX, Game, enemy_stat_ranges, boss_stat_ranges
+
+# === Vectorized Monte Carlo Combat ===
+# Runs huge numbers of fights at once as NumPy arrays, one element per fight,
+# following the same rules as Game.combat_turn / Enemy.attack /
+# tick_player. Enemy stats come from the engine's difficulty ranges, so
+# changing a formula there changes the curves here.
+#
+#   python montecarlo.py --fights 200000 --max-depth 30 --compare
+#
+# Simplifications: the player never runs or uses items, the post-boss shop
+# is skipped, and status effects don't carry over from one fight to the next.
+
+NO_SPECIAL, BURN, FREEZE = 0, 1, 2
+BURN_TURNS, BURN_DAMAGE = EFFECTS[EFFECT_INDEX["burn"]].turns, EFFECTS[EFFECT_INDEX["burn"]].damage
+FREEZE_TURNS = EFFECTS[EFFECT_INDEX["freeze"]].turns
+
+def stat_table(max_depth):
+    # Row d holds (min_hp, max_hp, min_atk, max_atk) for a room-d enemy, or
+    # for the boss when d is a boss room
+    table = np.zeros((max_depth + 1, 4), dtype=np.int64)
+    for depth in range(1, max_depth + 1):
+        ranges = boss_stat_ranges if depth % 10 == 0 else enemy_stat_ranges
+        min_hp, max_hp, min_atk, max_atk = ranges(depth)
+        table[depth] = min_hp, max(min_hp, max_hp), min_atk, max(min_atk, max_atk)
+    return table
+
+def roll_enemies(depths, table, rng, special_rate=0.3):
+    hp = rng.integers(table[depths, 0], table[depths, 1] + 1)
+    atk = rng.integers(table[depths, 2], table[depths, 3] + 1)
+    # Bosses always have a special; regular enemies only sometimes
+    has_special = (depths % 10 == 0) | (rng.random(depths.size) < special_rate)
+    special = np.where(has_special, rng.integers(BURN, FREEZE + 1, depths.size), NO_SPECIAL)
+    return hp, atk, special
+
+def fight(player_hp, enemy_hp, enemy_atk, special, rng, atk_bonus=0, blocks=0, use_special=False, max_turns=1000):
+    # Plays every fight to the end. Returns (won, turns, player_hp_left).
+    # Finished fights are written out and dropped from the working arrays,
+    # so every turn works on contiguous arrays of the fights still going.
+    n = enemy_hp.size
+    won_out = np.zeros(n, dtype=bool)
+    turns_out = np.full(n, max_turns, dtype=np.int32)
+    hp_out = np.zeros(n, dtype=np.int32)
+
+    ids = np.arange(n)
+    p_hp = np.broadcast_to(np.asarray(player_hp, dtype=np.int32), (n,)).copy()
+    p_burn = np.zeros(n, dtype=np.int32)
+    p_freeze = np.zeros(n, dtype=np.int32)
+    p_blocks = np.full(n, blocks, dtype=np.int32)
+    e_hp = enemy_hp.astype(np.int32)
+    e_atk = enemy_atk.astype(np.int32)
+    e_special = special.astype(np.int8)
+    e_burn = np.zeros(n, dtype=np.int32)
+    e_freeze = np.zeros(n, dtype=np.int32)
+    special_left = np.broadcast_to(np.asarray(use_special, dtype=bool), (n,)).copy()
+
+    for turn in range(1, max_turns + 1):
+        m = ids.size
+        if m == 0:
+            break
+
+        # All of this turn's dice in one draw: player damage, special effect,
+        # enemy damage, enemy special
+        u = rng.random((4, m))
+
+        # tick_player: burn ticks, then every effect counts down
+        p_hp -= BURN_DAMAGE * (p_burn > 0)
+        np.maximum(p_burn - 1, 0, out=p_burn)
+        np.maximum(p_freeze - 1, 0, out=p_freeze)
+
+        # A frozen player skips the whole turn, enemy included
+        acting = p_freeze == 0
+
+        # Player attack (special once per fight, when the policy uses it)
+        spec = special_left & acting
+        # randint(5, 15) for an attack, randint(8, 18) for the special
+        dmg = np.where(spec, 8, 5) + (u[0] * 11).astype(np.int32)
+        e_hp -= (dmg + atk_bonus) * acting
+        burn_effect = u[1] < 0.5
+        e_burn[spec & burn_effect] = BURN_TURNS
+        e_freeze[spec & ~burn_effect] = FREEZE_TURNS
+        special_left &= ~acting
+        killed = acting & (e_hp <= 0)
+
+        # Enemy.attack for the enemies still standing
+        attackers = acting & ~killed
+        frozen = attackers & (e_freeze > 0)
+        e_freeze -= frozen
+        hit = attackers & ~frozen
+        blocked = hit & (p_blocks > 0)
+        p_blocks -= blocked
+        p_hp -= (1 + (u[2] * e_atk).astype(np.int32)) * (hit & ~blocked)
+
+        burn = hit & (e_burn > 0)
+        e_hp -= BURN_DAMAGE * burn
+        e_burn -= burn
+
+        uses_special = hit & (e_special != NO_SPECIAL) & (u[3] < 0.4)
+        p_burn[uses_special & (e_special == BURN)] = BURN_TURNS
+        p_freeze[uses_special & (e_special == FREEZE)] = FREEZE_TURNS
+
+        # Dying ends the run even if the enemy fell on the same turn
+        dead = p_hp <= 0
+        done = dead | killed
+        if done.any():
+            finished = ids[done]
+            won_out[finished] = ~dead[done]
+            turns_out[finished] = turn
+            hp_out[finished] = p_hp[done]
+            keep = ~done
+            ids, p_hp, p_burn, p_freeze, p_blocks = ids[keep], p_hp[keep], p_burn[keep], p_freeze[keep], p_blocks[keep]
+            e_hp, e_atk, e_special, e_burn, e_freeze = e_hp[keep], e_atk[keep], e_special[keep], e_burn[keep], e_freeze[keep]
+            special_left = special_left[keep]
+
+    hp_out[ids] = p_hp  # anything still fighting at max_turns
+    return won_out, turns_out, hp_out
+
+# === Reports ===
+def depth_table(fights, max_depth, rng, player_hp=100, atk_bonus=0, use_special=False):
+    # One fresh fight per element at every depth, all depths in one batch
+    table = stat_table(max_depth)
+    depths = np.repeat(np.arange(1, max_depth + 1), fights)
+    hp, atk, special = roll_enemies(depths, table, rng)
+    won, turns, hp_left = fight(player_hp, hp, atk, special, rng, atk_bonus, use_special=use_special)
+
+    rows = []
+    for depth in range(1, max_depth + 1):
+        sl = slice((depth - 1) * fights, depth * fights)
+        w = won[sl]
+        kill_turns = turns[sl][w]
+        rows.append({
+            "depth": depth,
+            "boss": depth % 10 == 0,
+            "win_rate": w.mean(),
+            "turns_to_kill": kill_turns.mean() if kill_turns.size else float("nan"),
+            "turns_p90": np.percentile(kill_turns, 90) if kill_turns.size else float("nan"),
+            "hp_lost": (player_hp - hp_left[sl][w]).mean() if w.any() else float("nan"),
+        })
+    return rows
+
+def survival_curve(runs, max_depth, rng, player_hp=100, use_special=False):
+    # Whole runs, HP carried from room to room with the real room dice:
+    # golden rooms, bosses every 10th room, 70% enemies, otherwise a trap or blessing.
+    # curve[d - 1] is the share still alive after room d (room 1 has no fight).
+    table = stat_table(max_depth)
+    hp = np.full(runs, player_hp, dtype=np.int64)
+    alive = np.ones(runs, dtype=bool)
+    last_special = np.full(runs, -4, dtype=np.int64)
+    curve = [1.0]
+
+    for depth in range(2, max_depth + 1):
+        idx = np.flatnonzero(alive)
+        golden = rng.random(idx.size) < 0.1
+        spawn = (depth % 10 == 0) | (rng.random(idx.size) < 0.7)
+        fighters = idx[~golden & spawn]
+        eventers = idx[~golden & ~spawn]
+
+        trap = rng.random(eventers.size) < 0.5
+        amount = rng.integers(5, 16, eventers.size)
+        hp[eventers] += np.where(trap, -amount, amount)
+
+        if fighters.size:
+            depths = np.full(fighters.size, depth)
+            e_hp, e_atk, special = roll_enemies(depths, table, rng)
+            ready = use_special & (depth - last_special[fighters] >= 4)
+            won, _, hp_left = fight(hp[fighters], e_hp, e_atk, special, rng, use_special=ready)
+            hp[fighters] = hp_left
+            last_special[fighters[ready]] = depth
+
+        alive &= hp > 0
+        curve.append(alive.mean())
+    return curve
+
+def object_fights(fights, depth, seed=0):
+    # The slow reference: the same fights through engine Game/Player/Enemy objects
+    wins = 0
+    for i in range(fights):
+        game = Game(rng=random.Random(seed + i))
+        game.room_count = depth
+        game.enemy = game.content.boss(depth) if depth % 10 == 0 else game.content.enemy(depth)
+        game.in_combat = True
+        while game.in_combat and game.player.hp > 0:
+            game.combat_turn("attack")
+        wins += game.player.hp > 0
+    return wins / fights
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized Monte Carlo combat and difficulty curves.")
+    parser.add_argument("--fights", type=int, default=100000, help="fights per depth")
+    parser.add_argument("--max-depth", type=int, default=30)
+    parser.add_argument("--hp", type=int, default=100)
+    parser.add_argument("--atk-bonus", type=int, default=0)
+    parser.add_argument("--special", action="store_true", help="open each fight with the special attack when it's ready")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compare", action="store_true", help="also time the object-based engine on one depth")
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    start = time.perf_counter()
+    rows = depth_table(args.fights, args.max_depth, rng, args.hp, args.atk_bonus, args.special)
+    elapsed = time.perf_counter() - start
+    total = args.fights * args.max_depth
+    print(f"{total} fights in {elapsed:.2f}s ({total / elapsed:,.0f} fights/s)")
+    print(f"{'depth':>5} {'boss':>4} {'win%':>7} {'turns':>6} {'p90':>5} {'hp lost':>8}")
+    for r in rows:
+        print(f"{r['depth']:>5} {'yes' if r['boss'] else '':>4} {r['win_rate']:>7.1%} "
+              f"{r['turns_to_kill']:>6.2f} {r['turns_p90']:>5.0f} {r['hp_lost']:>8.1f}")
+
+    curve = survival_curve(args.fights, args.max_depth, rng, args.hp, args.special)
+    print("\nRun survival (alive after clearing room):")
+    print(" ".join(f"{d}:{p:.1%}" for d, p in enumerate(curve, start=1)))
+
+    if args.compare:
+        # Same depth, same number of fights, both ways
+        depth = min(5, args.max_depth)
+        n = min(args.fights, 20000)
+        start = time.perf_counter()
+        obj_win = object_fights(n, depth, args.seed)
+        obj_rate = n / (time.perf_counter() - start)
+
+        table = stat_table(depth)
+        depths = np.full(args.fights, depth)
+        start = time.perf_counter()
+        hp, atk, special = roll_enemies(depths, table, rng)
+        won, _, _ = fight(args.hp, hp, atk, special, rng)
+        vec_rate = args.fights / (time.perf_counter() - start)
+        print(f"\nDepth {depth}: object engine {obj_rate:,.0f} fights/s (win {obj_win:.1%}), "
+              f"vectorized {vec_rate:,.0f} fights/s (win {won.mean():.1%}), x{vec_rate / obj_rate:,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# === Speculative Room Prefetch ===
+# While the player reads the current room, the next few rooms are already
+# being generated in the background. Each RoomPlan carries the dice rolls for
+# that room (golden room, boss, enemy or event) plus the futures producing its
+# text and enemy, so advancing is usually just popping a finished plan.
+class RoomPlan:
+    def __init__(self, room_number, golden=False, is_boss=False, spawn=False, futures=(), stream=None):
+        self.room_number = room_number
+        self.golden = golden
+        self.is_boss = is_boss
+        self.spawn = spawn
+        self.futures = list(futures)
+        self.stream = stream  # StreamBuffer for the room text, when it's streamed
+
+    def ready(self):
+        return all(f.done() for f in self.futures)
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+class RoomPrefetcher:
+    def __init__(self, plan_room, depth=2):
+        self.plan_room = plan_room  # room_number -> RoomPlan, submits the work
+        self.depth = depth
+        self.plans = {}
+        self.hits = 0    # plan was already finished when the player got there
+        self.misses = 0  # player had to wait (or the room was never prefetched)
+
+    def fill(self, current_room):
+        # Anything at or behind the player is stale
+        for number in [n for n in self.plans if n <= current_room]:
+            self.plans.pop(number).cancel()
+        for number in range(current_room + 1, current_room + self.depth + 1):
+            if number not in self.plans:
+                self.plans[number] = self.plan_room(number)
+
+    def pop(self, room_number):
+        plan = self.plans.pop(room_number, None)
+        if plan is None:
+            plan = self.plan_room(room_number)
+        if plan.ready():
+            self.hits += 1
+        else:
+            self.misses += 1
+        return plan
+
+    def reset(self):
+        for plan in self.plans.values():
+            plan.cancel()
+        self.plans = {}
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "queued": len(self.plans)}
@@ -0,0 +1,93 @@
+import argparse
+import cProfile
+import hashlib
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+
+# === Trace Replay ===
+# Re-runs a run recorded with trace_record=PATH, headless and as fast as the
+# main loop goes: same seed, same input in the same frames, GPT results and
+# callbacks straight from the trace, no API calls. Prints where the run
+# ended up, so two replays (or a replay and the recording) can be compared,
+# and optionally profiles the main thread:
+#
+#   trace_record=run.jsonl python main.py
+#   python replay.py run.jsonl --profile replay.prof --top 30
+#
+# A saved game the recording resumed from is part of the trace; the real
+# save, GPT cache and bestiary are never read or written. Settings that
+# change which requests are made (batch_rooms, prefetch_rooms, memory_every,
+# ...) must match the recording's, or the replay stops as diverged.
+
+def capture(shared):
+    # main.py never returns (it exits through sys.exit), so its module is
+    # grabbed from here while it runs
+    while "main" not in sys.modules or not hasattr(sys.modules["main"], "game"):
+        time.sleep(0.01)
+    shared["module"] = sys.modules["main"]
+
+def digest(module):
+    game = module.game
+    log = "\n".join(str(line) for line in module.run_log() if line is not None)
+    return {
+        "room": game.room_count,
+        "hp": game.player.hp,
+        "gold": game.player.gold,
+        "inventory": dict(game.player.inventory),
+        "game_over": game.game_over,
+        "log": hashlib.sha256(log.encode("utf-8")).hexdigest()[:16],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded input trace deterministically.")
+    parser.add_argument("trace", help="a trace written with trace_record=PATH")
+    parser.add_argument("--profile", metavar="OUT", help="profile the replay and write the stats to OUT (.prof)")
+    parser.add_argument("--top", type=int, default=25, help="with --profile: functions to print, by cumulative time")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    os.environ["trace_replay"] = os.path.abspath(args.trace)
+    os.environ.pop("trace_record", None)
+    os.environ.setdefault("api_key", "replay")  # the client is never used, but must build
+    os.environ["save_path"] = os.path.join(scratch, "savegame.dat")
+    os.environ["cache_path"] = os.path.join(scratch, "gpt_cache.json")
+    os.environ["bestiary_path"] = os.path.join(scratch, "bestiary.json")
+    os.environ["telemetry_path"] = ""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+    shared = {"module": None}
+    threading.Thread(target=capture, args=(shared,), daemon=True).start()
+    profiler = cProfile.Profile() if args.profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        import main  # noqa: F401 -- plays the trace, then quits
+    except SystemExit:
+        pass
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    module = shared["module"]
+    if module is None:
+        sys.exit("The game exited before it started")
+    trace = module.trace
+    left = len(trace.frames) - trace.position + sum(map(len, trace.fired_by_frame.values()))
+    print(f"\nReplayed {trace.position} of {len(trace.frames)} recorded frames in {elapsed:.2f}s"
+          + (f" ({left} recorded frames or callbacks never reached)" if left else ""))
+    print("End state:", digest(module))
+
+    if profiler is not None:
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+        print("Profile written to", args.profile)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import math
+import threading
+from collections import deque
+
+# === Model Routing ===
+# Each GPT call site has a route: model tiers (preferred first), a token
+# budget, a temperature and a latency target (SLO). A site runs on its
+# current tier until too many of its recent calls miss the SLO, then drops
+# to the next tier for the rest of the session.
+#
+# The token budget is the route's ceiling. A route that sets a lower
+# min_tokens lets it adapt: it follows the longest recent reply with some
+# headroom, down to that floor. A reply cut off by the budget isn't a sample
+# of how long replies are; it doubles the budget and raises the floor to
+# match, so the budget never shrinks back below it.
+
+class Route:
+    def __init__(self, models, max_tokens=150, temperature=0.8, slo=3.0, min_tokens=None):
+        self.models = list(models)
+        self.max_tokens = max_tokens  # the ceiling
+        self.min_tokens = min(min_tokens or max_tokens, max_tokens)  # the floor; the ceiling keeps it fixed
+        self.floor = self.min_tokens  # raised by truncated replies
+        self.temperature = temperature
+        self.slo = slo  # seconds; to the first token for streamed calls
+
+        self.tier = 0
+        self.budget = max_tokens
+        self.latencies = deque(maxlen=20)  # on the current tier
+        self.completions = deque(maxlen=20)
+        self.calls = {}  # model -> calls
+        self.misses = 0
+        self.downgrades = []  # (from, to, p95 at the time)
+
+    @property
+    def model(self):
+        return self.models[self.tier]
+
+class ModelRouter:
+    def __init__(self, routes, default=None, min_samples=8, miss_ratio=0.25, headroom=1.5):
+        self.routes = routes
+        self.default = default or Route(["gpt-4"])
+        self.min_samples = min_samples
+        self.miss_ratio = miss_ratio  # share of recent calls over the SLO that triggers a downgrade
+        self.headroom = headroom
+        self.lock = threading.Lock()
+
+    def route(self, site):
+        return self.routes.get(site, self.default)
+
+    def pick(self, site):
+        # (model, max_tokens, temperature) for the next call from site
+        route = self.route(site)
+        with self.lock:
+            return route.model, route.budget, route.temperature
+
+    def record(self, site, model, seconds, completion_tokens=None, truncated=False):
+        # Returns (from, to) when this call triggered a downgrade, else None
+        route = self.route(site)
+        with self.lock:
+            route.calls[model] = route.calls.get(model, 0) + 1
+            if truncated:
+                route.floor = min(route.max_tokens, max(route.floor, (completion_tokens or route.budget) * 2))
+                route.budget = max(route.budget, route.floor)
+            else:
+                if completion_tokens:
+                    route.completions.append(completion_tokens)
+                if route.completions:
+                    wanted = math.ceil(max(route.completions) * self.headroom)
+                    route.budget = max(route.floor, min(route.max_tokens, wanted))
+
+            if model != route.model:
+                return None  # a call from before the last downgrade
+            route.latencies.append(seconds)
+            if seconds > route.slo:
+                route.misses += 1
+            missed = sum(latency > route.slo for latency in route.latencies)
+            if (len(route.latencies) >= self.min_samples and missed / len(route.latencies) > self.miss_ratio
+                    and route.tier + 1 < len(route.models)):
+                before = route.model
+                route.downgrades.append((before, route.models[route.tier + 1], percentile(route.latencies, 0.95)))
+                route.tier += 1
+                route.latencies.clear()
+                return before, route.model
+        return None
+
+    def report(self):
+        lines = []
+        with self.lock:
+            for site, route in sorted(self.routes.items()):
+                if not route.calls:
+                    continue
+                calls = ", ".join(f"{model} x{count}" for model, count in route.calls.items())
+                p95 = f"{percentile(route.latencies, 0.95):.2f}s" if route.latencies else "-"
+                line = (f"{site:>11}: {route.model} (SLO {route.slo:.1f}s, recent p95 {p95}, "
+                        f"{route.misses} misses, max_tokens {route.budget}) | {calls}")
+                for before, after, p95_then in route.downgrades:
+                    line += f" | downgraded {before} -> {after} at p95 {p95_then:.2f}s"
+                lines.append(line)
+        return lines
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
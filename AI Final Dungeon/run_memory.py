@@ -0,0 +1,136 @@
+# === Run Memory ===
+# What the narration prompts know about the run so far: the quest, a short
+# summary of older rooms, the last few rooms (what was in them and how the
+# fight went) and a tally of foes beaten. Its text never exceeds `budget`
+# tokens however long the run gets, so prompt size and latency stay flat.
+#
+# Most updates are local: each room adds one short entry, and the text shows
+# as many of the newest entries as fit the budget left after the quest (a
+# fifth at most) and the summary (two fifths). Every `every` rooms the caller
+# is asked to fold the entries into the summary with one cheap LLM call;
+# until that lands, or if it fails, older entries just stop being shown (the
+# tally keeps counting them), and past 4 * every they're dropped.
+#
+# Only the game thread updates it. Worker threads building prompts just read
+# `text`, which is replaced whole on every change.
+
+CHARS_PER_TOKEN = 4  # close enough for English prose
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def clip(text, tokens):
+    # At most `tokens` tokens of text, cut at a word
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(",;:") + "..."
+
+class RunMemory:
+    def __init__(self, budget=120, every=5):
+        self.budget = budget  # tokens; 0 turns the memory off
+        self.every = every  # rooms per LLM summary
+        self.reset()
+
+    def reset(self, quest=None):
+        self.quest = quest
+        self.summary = ""
+        self.entries = []  # [room, what, outcome] since the summary, oldest first
+        self.room = 0
+        self.defeated = 0
+        self.bosses = []  # names of bosses beaten, in order
+        self.summarized_room = 0  # rooms up to here are in the summary (or were dropped)
+        self.pending = None  # last room covered by the summary being written
+        self.dropped = 0
+        self.summaries = 0
+        self.render()
+
+    # --- Events, from the game thread ---
+    def enter_room(self, number, golden=False, enemy=None):
+        if golden:
+            what = "a golden treasure room"
+        elif enemy is not None:
+            what = f"the boss {enemy.name}" if enemy.is_boss else enemy.name
+        else:
+            what = "no foe"
+        self.entries.append([number, what, None])
+        self.room = number
+        if len(self.entries) > 4 * self.every:
+            self.entries.pop(0)
+            self.dropped += 1
+        self.render()
+
+    def fight_over(self, enemy, won):
+        if won:
+            self.defeated += 1
+            if enemy.is_boss:
+                self.bosses.append(enemy.name)
+        if self.entries:
+            self.entries[-1][2] = "beaten" if won else "fled"
+        self.render()
+
+    # --- LLM summaries ---
+    def due(self):
+        # Whether to ask for a summary now (then call summary_prompt())
+        return (self.budget > 0 and self.pending is None and bool(self.entries)
+                and self.room - self.summarized_room >= self.every)
+
+    def summary_prompt(self):
+        self.pending = self.room
+        words = self.budget * 3 // 10  # two fifths of the budget, at about 0.75 words a token
+        return (
+            f"Summarize this fantasy dungeon crawler's run so far in at most {words} words, keeping what "
+            f"matters for the story ahead: the quest, notable foes and turning points. Plain prose, no lists.\n"
+            f"Quest: {self.quest or 'unknown'}\n"
+            f"Summary so far: {self.summary or 'none'}\n"
+            f"Since then: {self.describe(self.entries)}"
+        )
+
+    def absorb(self, text):
+        # The summary call's reply (None if it failed); entries it covered go
+        covered, self.pending = self.pending, None
+        if covered is None:
+            return
+        if text:
+            self.summary = clip(" ".join(text.split()), self.budget * 2 // 5)
+            self.entries = [entry for entry in self.entries if entry[0] > covered]
+            self.summaries += 1
+        self.summarized_room = covered  # a failure isn't retried until `every` more rooms
+        self.render()
+
+    # --- Text ---
+    def describe(self, entries):
+        parts = []
+        for room, what, outcome in entries:
+            parts.append(f"room {room}: {what} ({outcome})" if outcome else f"room {room}: {what}")
+        return "; ".join(parts)
+
+    def render(self):
+        # Empty until there's something about this run to tell
+        if self.budget <= 0 or not (self.quest or self.summary or self.entries or self.defeated):
+            self.text = ""
+            return
+        text = "The run so far:"
+        if self.quest:
+            text += f" Quest: {clip(self.quest, self.budget // 5)}"
+        if self.summary:
+            text += f" Earlier: {self.summary}"
+        tally = ""
+        if self.defeated:
+            tally = f" Foes beaten: {self.defeated}" + (f", bosses {', '.join(self.bosses[-2:])}." if self.bosses else ".")
+
+        # The newest entries that still fit
+        room_left = self.budget * CHARS_PER_TOKEN - len(text) - len(tally) - len(" Recently: .")
+        shown = 0
+        for entry in reversed(self.entries):
+            room_left -= len(self.describe([entry])) + 2
+            if room_left < 0:
+                break
+            shown += 1
+        if shown:
+            text += f" Recently: {self.describe(self.entries[-shown:])}."
+        self.text = clip(text + tally, self.budget)
+
+    def stats(self):
+        return {"tokens": estimate_tokens(self.text), "budget": self.budget, "entries": len(self.entries),
+                "dropped": self.dropped, "summaries": self.summaries}
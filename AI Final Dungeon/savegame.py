@@ -0,0 +1,210 @@
+import json
+import os
+import struct
+import threading
+import zlib
+
+from engine import Enemy
+
+# === Save Snapshots ===
+# The whole run (player, enemy, room, log, flags and the names of enemies
+# already met) packed into a small versioned binary snapshot:
+#
+#   MAGIC, version byte, zlib(fields)
+#
+# Fields are little-endian ints and length-prefixed UTF-8 strings, in the
+# order encode_snapshot() writes them. A new field means a new VERSION;
+# snapshots from any other version are refused rather than half-read.
+
+MAGIC = b"DSAV"
+VERSION = 1
+NONE_LENGTH = 0xFFFFFFFF
+
+class Writer:
+    def __init__(self):
+        self.parts = []
+
+    def put_int(self, value):
+        self.parts.append(struct.pack("<i", value))
+
+    def put_str(self, value):
+        if value is None:
+            self.parts.append(struct.pack("<I", NONE_LENGTH))
+            return
+        data = str(value).encode("utf-8")
+        self.parts.append(struct.pack("<I", len(data)) + data)
+
+    def put_counts(self, mapping):
+        # {name: int}, e.g. inventory and status effects
+        self.put_int(len(mapping))
+        for name, count in mapping.items():
+            self.put_str(name)
+            self.put_int(count)
+
+    def put_strs(self, values):
+        self.put_int(len(values))
+        for value in values:
+            self.put_str(value)
+
+    def getvalue(self):
+        return b"".join(self.parts)
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def take(self, size):
+        if self.pos + size > len(self.data):
+            raise ValueError("Save snapshot is truncated")
+        chunk = self.data[self.pos:self.pos + size]
+        self.pos += size
+        return chunk
+
+    def get_int(self):
+        return struct.unpack("<i", self.take(4))[0]
+
+    def get_str(self):
+        length = struct.unpack("<I", self.take(4))[0]
+        return None if length == NONE_LENGTH else self.take(length).decode("utf-8")
+
+    def get_counts(self):
+        return {self.get_str(): self.get_int() for _ in range(self.get_int())}
+
+    def get_strs(self):
+        return [self.get_str() for _ in range(self.get_int())]
+
+def encode_snapshot(game, seen_enemies=(), combat_log=None):
+    # combat_log overrides game.combat_log, for when an overlay is covering it
+    w = Writer()
+    w.put_int(game.room_count)
+    w.put_int(game.special_attack_last_used_room)
+    w.put_int(game.game_over | game.in_combat << 1 | game.post_boss_shop << 2)
+    w.put_str(game.room_text)
+    w.put_strs(game.combat_log if combat_log is None else combat_log)
+
+    player = game.player
+    w.put_int(player.hp)
+    w.put_int(player.gold)
+    w.put_int(player.blocks_remaining)
+    w.put_int(player.atk_bonus)
+    w.put_counts(player.inventory)
+    w.put_counts(player.status_effects)
+
+    enemy = game.enemy
+    w.put_int(enemy is not None)
+    if enemy is not None:
+        w.put_str(enemy.name)
+        w.put_str(enemy.description)
+        w.put_int(enemy.hp)
+        w.put_int(enemy.atk)
+        w.put_int(enemy.is_boss)
+        w.put_counts(enemy.status_effects)
+        w.put_str(json.dumps(enemy.special) if enemy.special else None)
+
+    w.put_strs(sorted(seen_enemies))
+    return MAGIC + bytes([VERSION]) + zlib.compress(w.getvalue(), 6)
+
+def restore_snapshot(game, data):
+    # Loads a snapshot into game and returns the seen enemy names.
+    # Raises ValueError for anything that isn't a version-1 snapshot.
+    if data[:len(MAGIC)] != MAGIC or len(data) <= len(MAGIC):
+        raise ValueError("Not a save snapshot")
+    if data[len(MAGIC)] != VERSION:
+        raise ValueError(f"Unsupported save version {data[len(MAGIC)]}")
+    try:
+        r = Reader(zlib.decompress(data[len(MAGIC) + 1:]))
+    except zlib.error as e:
+        raise ValueError("Corrupt save snapshot") from e
+
+    game.reset()
+    game.room_count = r.get_int()
+    game.special_attack_last_used_room = r.get_int()
+    flags = r.get_int()
+    game.game_over, game.in_combat, game.post_boss_shop = bool(flags & 1), bool(flags & 2), bool(flags & 4)
+    game.room_text = r.get_str()
+    game.combat_log = r.get_strs()
+
+    player = game.player
+    player.hp = r.get_int()
+    player.gold = r.get_int()
+    player.blocks_remaining = r.get_int()
+    player.atk_bonus = r.get_int()
+    player.inventory = r.get_counts()
+    player.status_effects = r.get_counts()
+
+    if r.get_int():
+        enemy = Enemy(name=r.get_str(), description=r.get_str(), hp=r.get_int(), atk=r.get_int())
+        enemy.is_boss = bool(r.get_int())
+        enemy.status_effects = r.get_counts()
+        special = r.get_str()
+        enemy.special = json.loads(special) if special else None
+        game.enemy = enemy
+
+    return r.get_strs()
+
+# === Background Autosave ===
+# save() only hands the snapshot over; a worker thread writes the newest one
+# (tmp file + os.replace, so a crash mid-write keeps the previous save) and
+# skips snapshots identical to what is already on disk. delete() is queued
+# the same way: it replaces any snapshot still waiting, and a later save()
+# replaces it.
+DELETE = object()
+
+class AutoSaver:
+    def __init__(self, path):
+        self.path = path
+        self.latest = None
+        self.written = None
+        self.writing = False
+        self.cond = threading.Condition()
+        self.writes = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def save(self, data):
+        with self.cond:
+            self.latest = data
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.latest is None:
+                    self.cond.wait()
+                data, self.latest = self.latest, None
+                self.writing = True
+            try:
+                if data is DELETE:
+                    self.written = None
+                    try:
+                        os.remove(self.path)
+                    except FileNotFoundError:
+                        pass
+                elif data != self.written:
+                    tmp_path = self.path + ".tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp_path, self.path)
+                    self.written = data
+                    self.writes += 1
+            except OSError as e:
+                print("Autosave failed:", e)
+            with self.cond:
+                self.writing = False
+                self.cond.notify_all()
+
+    def flush(self, timeout=2.0):
+        # Waits for pending snapshots to reach the disk, e.g. before quitting
+        with self.cond:
+            self.cond.wait_for(lambda: self.latest is None and not self.writing, timeout)
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def delete(self):
+        # The run is over; nothing left to resume
+        self.save(DELETE)
@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from api_client import CircuitBreaker, CircuitOpen, ResilientClient, TokenBucket
+from content_cache import ContentCache
+from engine import Game, LocalContent, enemy_stat_ranges, boss_stat_ranges
+from enemy_schema import ENEMY_FORMAT, parse_lenient, enemy_from_data
+from routing import ModelRouter, Route
+
+# === Multi-Session Game Server ===
+# Many independent dungeon runs on one asyncio event loop, one per TCP
+# connection, with a line-based text protocol: the client sends a command
+# per line and gets the game state back as one JSON line.
+#
+#   new | advance | attack | special | run | buy N | use ITEM | shop N | state | stats | quit
+#
+# The engine is synchronous and fast, so it runs on the loop itself. Only GPT
+# calls leave it: every session shares one SharedLLM (API client, content
+# cache and router), which runs at most `concurrency` requests at a time on
+# worker threads while the rest wait on the loop. Each session prefetches
+# its next room, and anything GPT can't provide comes from LocalContent.
+#
+#   python server.py --port 8770 --concurrency 16
+#   python server.py --local       # no API at all
+
+class SharedLLM:
+    def __init__(self, api, cache, router, concurrency=16):
+        self.api = api
+        self.cache = cache
+        self.router = router
+        self.slots = asyncio.Semaphore(concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        self.calls = 0
+        self.cache_hits = 0
+        self.failures = 0
+
+    async def ask(self, prompt, site, response_format=None):
+        # The reply text, or None when the API can't give one
+        model, max_tokens, temperature = self.router.pick(site)
+        text = self.cache.get(prompt, model, temperature)
+        if text is not None:
+            self.cache_hits += 1
+            return text
+
+        def request(client, timeout):
+            started = time.perf_counter()
+            extra = {"response_format": response_format} if response_format else {}
+            response = client.chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **extra
+            )
+            choice = response.choices[0]
+            return choice.message.content.strip(), response.usage, choice.finish_reason, time.perf_counter() - started
+
+        def fetch():
+            # On a worker thread: the request, then the cache write, so
+            # neither blocks the loop
+            text, usage, finish_reason, seconds = self.api.call(request)
+            truncated = finish_reason == "length"
+            self.router.record(site, model, seconds, usage.completion_tokens if usage is not None else None,
+                               truncated)
+            if not truncated:  # a cut-off reply isn't worth keeping
+                self.cache.put(prompt, model, temperature, text)
+            return text
+
+        async with self.slots:
+            try:
+                text = await asyncio.get_running_loop().run_in_executor(self.pool, fetch)
+            except CircuitOpen:
+                self.failures += 1
+                return None
+            except Exception as e:
+                self.failures += 1
+                print("GPT call failed:", e)
+                return None
+        self.calls += 1
+        return text
+
+    def stats(self):
+        return {"calls": self.calls, "cache_hits": self.cache_hits, "failures": self.failures,
+                "api": self.api.stats()}
+
+def build_llm(concurrency):
+    load_dotenv()
+    key = os.getenv('api_key')
+
+    def build_client():
+        from openai import OpenAI
+        return OpenAI(api_key=key, base_url=os.getenv('api_base_url') or None, max_retries=0)
+
+    api = ResilientClient(
+        build_client,
+        TokenBucket(float(os.getenv('api_rate', 20)), int(os.getenv('api_burst', 40))),
+        CircuitBreaker(int(os.getenv('breaker_failures', 5)), float(os.getenv('breaker_reset', 30))),
+        retries=int(os.getenv('api_retries', 4)),
+        deadline=float(os.getenv('api_deadline', 20)),
+        attempt_timeout=float(os.getenv('api_timeout', 10))
+    )
+    cache = ContentCache(
+        os.getenv('cache_path', "gpt_cache.json"),
+        max_entries=int(os.getenv('cache_max_entries', 500)),
+        variants=int(os.getenv('cache_variants', 3))
+    )
+    cache.start_flusher(float(os.getenv('cache_flush_interval', 5)))
+    json_model = os.getenv('json_model', "gpt-4o")
+    router = ModelRouter({
+        "room": Route(["gpt-4o", "gpt-4o-mini"], max_tokens=150, slo=3.0),
+        "enemy": Route([json_model, "gpt-4o-mini"], max_tokens=200, slo=4.0),
+        "boss": Route([json_model], max_tokens=250, slo=8.0),
+        "quest": Route(["gpt-4o-mini"], max_tokens=60, temperature=0.9, slo=3.0),
+    }, default=Route(["gpt-4o-mini"]))
+    return SharedLLM(api, cache, router, concurrency)
+
+# === Sessions ===
+ENEMY_PROMPT = (
+    "Create a fantasy dungeon {kind} for room {room}, with a name, description, HP ({min_hp}-{max_hp}), "
+    "ATK ({min_atk}-{max_atk}) and {special}. Respond ONLY in JSON like:\n"
+    '{{"name": "", "description": "", "hp": 50, "atk": 10, '
+    '"special": {{"name": "Frost Bite", "effect": "freeze", "description": "The enemy bites with icy fangs!"}}}}'
+)
+
+class Session:
+    def __init__(self, llm=None, seed=None):
+        self.rng = random.Random(seed)
+        self.local = LocalContent(self.rng)
+        self.game = Game(rng=self.rng, content=self.local)  # flavor text stays local
+        self.llm = llm
+        self.seen_enemies = set()
+        self.next_room = None  # task for the prefetched (golden, room_text, enemy)
+
+    async def ask(self, prompt, site, response_format=None):
+        if self.llm is None:
+            return None
+        return await self.llm.ask(prompt, site, response_format)
+
+    async def room_text(self, number):
+        text = await self.ask("Describe a fantasy dungeon room in 1-3 sentences with atmosphere, "
+                              "lighting, smells, and sounds.", "room")
+        return text or self.local.room_text(number)
+
+    async def quest(self):
+        text = await self.ask("Generate a fantasy dungeon quest for a player. Keep it short and exciting "
+                              "(1 sentence).", "quest")
+        return text or self.local.quest()
+
+    async def enemy(self, number, is_boss=False):
+        ranges = boss_stat_ranges(number) if is_boss else enemy_stat_ranges(number)
+        min_hp, max_hp, min_atk, max_atk = ranges
+        prompt = ENEMY_PROMPT.format(
+            kind="boss" if is_boss else "enemy", room=number, min_hp=min_hp, max_hp=max_hp,
+            min_atk=min_atk, max_atk=max_atk,
+            special="a burn or freeze special ability" if is_boss else "an optional special ability"
+        )
+        response = await self.ask(prompt, "boss" if is_boss else "enemy", ENEMY_FORMAT)
+        enemy = enemy_from_data(parse_lenient(response), ranges, is_boss=is_boss)
+        if enemy is None or (not is_boss and enemy.name in self.seen_enemies):
+            enemy = self.local.boss(number) if is_boss else self.local.enemy(number)
+        self.seen_enemies.add(enemy.name)
+        return enemy
+
+    async def plan(self, number):
+        golden, is_boss, spawn = self.game.roll_room(number)
+        if golden:
+            return True, None, None
+        if spawn:
+            room_text, enemy = await asyncio.gather(self.room_text(number), self.enemy(number, is_boss))
+            return False, room_text, enemy
+        return False, await self.room_text(number), None
+
+    def prefetch(self):
+        self.next_room = asyncio.ensure_future(self.plan(self.game.room_count + 1))
+
+    async def new_run(self):
+        self.close()
+        self.game.reset()
+        self.seen_enemies.clear()
+        room_text, quest = await asyncio.gather(self.room_text(1), self.quest())
+        self.game.start(room_text, quest)
+        self.prefetch()
+
+    async def advance(self):
+        golden, room_text, enemy = await self.next_room
+        self.game.room_count += 1
+        self.game.enter_room(golden, room_text, enemy)
+        self.prefetch()
+
+    async def command(self, name, arg):
+        # Applies one command; returns an error message or None
+        game = self.game
+        if name == "new":
+            await self.new_run()
+            return None
+        if name == "state":
+            return None
+        if game.game_over:
+            return "the run is over; send new"
+
+        if name == "advance":
+            if game.in_combat or game.post_boss_shop:
+                return "finish the fight or the shop first"
+            await self.advance()
+        elif name in ("attack", "special"):
+            if not game.in_combat:
+                return "not in combat"
+            game.combat_turn(name)
+        elif name == "run":
+            if not game.in_combat:
+                return "not in combat"
+            game.run_away()
+        elif name == "buy":
+            if game.in_combat or not arg.isdigit():
+                return "usage: buy N (out of combat)"
+            game.combat_log.append(game.buy(int(arg) - 1) or "No such item.")
+        elif name == "use":
+            game.combat_log.append(game.use_item(arg))
+        elif name == "shop":
+            if not game.post_boss_shop or not arg.isdigit():
+                return "usage: shop N (after a boss)"
+            game.hp_shop(int(arg))
+        else:
+            return f"unknown command {name!r}"
+        game.check_death()
+        return None
+
+    def state(self):
+        game = self.game
+        enemy = game.enemy if game.in_combat else None
+        return {
+            "room": game.room_count,
+            "hp": game.player.hp,
+            "gold": game.player.gold,
+            "inventory": game.player.inventory,
+            "room_text": game.room_text,
+            "log": [str(line) for line in game.combat_log if line is not None],
+            "in_combat": game.in_combat,
+            "special_ready": game.special_ready(),
+            "post_boss_shop": game.post_boss_shop,
+            "game_over": game.game_over,
+            "enemy": enemy and {"name": enemy.name, "hp": enemy.hp, "atk": enemy.atk, "is_boss": enemy.is_boss},
+        }
+
+    def close(self):
+        if self.next_room is not None:
+            self.next_room.cancel()
+            self.next_room = None
+
+# === Server ===
+class DungeonServer:
+    def __init__(self, llm=None):
+        self.llm = llm
+        self.sessions = 0
+        self.active = 0
+        self.actions = 0
+        self.started = time.perf_counter()
+
+    def stats(self):
+        stats = {
+            "sessions": self.sessions,
+            "active": self.active,
+            "actions": self.actions,
+            "uptime": time.perf_counter() - self.started,
+            "cpu_seconds": time.process_time(),
+        }
+        if self.llm is not None:
+            stats["llm"] = self.llm.stats()
+        return stats
+
+    async def handle(self, reader, writer):
+        session = Session(self.llm)
+        self.sessions += 1
+        self.active += 1
+        try:
+            await session.new_run()
+            await send(writer, {"ok": True, "state": session.state()})
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                name, _, arg = line.decode("utf-8", "replace").strip().partition(" ")
+                if name == "quit":
+                    break
+                if name == "stats":
+                    await send(writer, {"ok": True, "stats": self.stats()})
+                    continue
+                error = await session.command(name, arg.strip())
+                self.actions += 1
+                reply = {"ok": error is None, "state": session.state()}
+                if error:
+                    reply["error"] = error
+                await send(writer, reply)
+        except ConnectionError:
+            pass
+        finally:
+            self.active -= 1
+            session.close()
+            writer.close()
+
+async def send(writer, message):
+    writer.write(json.dumps(message).encode("utf-8") + b"\n")
+    await writer.drain()
+
+async def serve(args):
+    llm = None if args.local else build_llm(args.concurrency)
+    dungeon = DungeonServer(llm)
+    server = await asyncio.start_server(dungeon.handle, args.host, args.port, limit=2 ** 16)
+    host, port = server.sockets[0].getsockname()[:2]
+    print(f"Dungeon server on {host}:{port} ({'local content' if llm is None else 'GPT content'}, "
+          f"{args.concurrency} GPT requests at a time)", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if llm is not None:
+            llm.cache.close()
+        print("Server stats:", dungeon.stats(), flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many dungeon sessions over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8770, help="0 picks a free port")
+    parser.add_argument("--concurrency", type=int, default=16, help="GPT requests in flight across all sessions")
+    parser.add_argument("--local", action="store_true", help="local content only, no API calls")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import argparse
+import random
+import statistics
+import time
+
+from engine import Game
+
+# === Headless Batch Simulation ===
+# Plays many seeded runs of the engine with local content and a scripted
+# policy, no display, audio or API key needed:
+#
+#   python simulate.py --runs 5000 --policy attack special cautious
+
+# === Policies ===
+# A policy looks at the game and returns (action, argument).
+def policy_attack(game):
+    if game.post_boss_shop:
+        return "hp_shop", 4
+    if game.in_combat:
+        return "attack", None
+    return "advance", None
+
+def policy_special(game):
+    if game.in_combat and game.special_ready():
+        return "special", None
+    return policy_attack(game)
+
+def policy_cautious(game):
+    player = game.player
+    if game.post_boss_shop:
+        return "hp_shop", 3 if player.hp > 15 else 4
+    if game.in_combat:
+        if player.hp < 30 and player.inventory.get("Healing Potion"):
+            return "use", "Healing Potion"
+        if player.hp < 15:
+            return "run", None
+        if game.special_ready():
+            return "special", None
+        return "attack", None
+    if player.gold >= 10 and player.inventory.get("Healing Potion", 0) < 3:
+        return "buy", 0
+    return "advance", None
+
+POLICIES = {
+    "attack": policy_attack,
+    "special": policy_special,
+    "cautious": policy_cautious,
+}
+
+# === Runner ===
+def step(game, action, arg):
+    if action == "advance":
+        game.advance()
+    elif action in ("attack", "special"):
+        game.combat_turn(action)
+    elif action == "run":
+        game.run_away()
+    elif action == "use":
+        game.use_item(arg)
+    elif action == "buy":
+        game.buy(arg)
+    elif action == "hp_shop":
+        game.hp_shop(arg)
+    game.check_death()
+
+def play(seed, policy, max_rooms=500, max_steps=20000):
+    game = Game(rng=random.Random(seed))
+    game.start(game.content.room_text(1), game.content.quest())
+    steps = 0
+    while not game.game_over and game.room_count < max_rooms and steps < max_steps:
+        action, arg = policy(game)
+        step(game, action, arg)
+        steps += 1
+    return game.room_count, steps, game.game_over
+
+def simulate(policy_name, runs, seed=0, max_rooms=500):
+    policy = POLICIES[policy_name]
+    start = time.perf_counter()
+    results = [play(seed + i, policy, max_rooms) for i in range(runs)]
+    elapsed = time.perf_counter() - start
+
+    rooms = [r for r, _, _ in results]
+    steps = sum(s for _, s, _ in results)
+    return {
+        "policy": policy_name,
+        "runs": runs,
+        "runs_per_sec": runs / elapsed if elapsed else float("inf"),
+        "steps_per_sec": steps / elapsed if elapsed else float("inf"),
+        "mean_room": statistics.mean(rooms),
+        "median_room": statistics.median(rooms),
+        "max_room": max(rooms),
+        "reached_10": sum(r >= 10 for r in rooms) / runs,
+        "reached_20": sum(r >= 20 for r in rooms) / runs,
+        "survived": sum(not dead for _, _, dead in results) / runs,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Play seeded dungeon runs headless.")
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run; run i uses seed + i")
+    parser.add_argument("--max-rooms", type=int, default=500)
+    parser.add_argument("--policy", nargs="+", default=["attack"], choices=sorted(POLICIES))
+    args = parser.parse_args()
+
+    for name in args.policy:
+        r = simulate(name, args.runs, args.seed, args.max_rooms)
+        print(f"{r['policy']:>9}: {r['runs']} runs, {r['runs_per_sec']:.0f} runs/s, {r['steps_per_sec']:.0f} steps/s | "
+              f"room mean {r['mean_room']:.1f}, median {r['median_room']}, max {r['max_room']} | "
+              f"reached 10: {r['reached_10']:.1%}, 20: {r['reached_20']:.1%}, survived: {r['survived']:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+
+# === Telemetry ===
+# Counters and fixed-bucket histograms keyed by metric name and labels,
+# safe to update from the GPT worker threads. Snapshots are appended to a
+# JSON-lines file and the current totals are written in the Prometheus text
+# format, both on a background thread every few seconds and once at exit.
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+FRAME_BUCKETS = (0.001, 0.002, 0.004, 0.008, 0.016, 0.033, 0.066, 0.1, 0.25, 1.0)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for count in self.counts:
+            total += count
+            yield total
+
+class Telemetry:
+    def __init__(self, prefix="dungeon"):
+        self.prefix = prefix
+        self.kinds = {}  # name -> ("counter" | "histogram", help, buckets)
+        self.series = {}  # (name, sorted label items) -> int | Histogram
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+
+    def counter(self, name, help_text):
+        self.kinds[name] = ("counter", help_text, None)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.kinds[name] = ("histogram", help_text, buckets)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.series.get(key)
+            if histogram is None:
+                histogram = self.series[key] = Histogram(self.kinds[name][2])
+            histogram.observe(value)
+
+    def total(self, name, **labels):
+        # Sum of a counter over every series carrying these labels
+        wanted = set(labels.items())
+        with self.lock:
+            return sum(value for (series_name, series_labels), value in self.series.items()
+                       if series_name == name and wanted <= set(series_labels))
+
+    def snapshot(self):
+        with self.lock:
+            metrics = []
+            for (name, labels), value in sorted(self.series.items()):
+                entry = {"name": f"{self.prefix}_{name}", "labels": dict(labels)}
+                if isinstance(value, Histogram):
+                    entry.update(count=value.count, sum=round(value.sum, 6),
+                                 buckets=dict(zip([*map(str, value.buckets), "+Inf"], value.cumulative())))
+                else:
+                    entry["value"] = value
+                metrics.append(entry)
+        return {"time": time.time(), "metrics": metrics}
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            by_name = {}
+            for (name, labels), value in sorted(self.series.items()):
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in by_name.items():
+                kind, help_text, buckets = self.kinds[name]
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {full} {help_text}")
+                lines.append(f"# TYPE {full} {kind}")
+                for labels, value in series:
+                    if kind == "counter":
+                        lines.append(f"{full}{format_labels(labels)} {value}")
+                        continue
+                    for bound, total in zip([*map(str, buckets), "+Inf"], value.cumulative()):
+                        lines.append(f"{full}_bucket{format_labels(labels + (('le', bound),))} {total}")
+                    lines.append(f"{full}_sum{format_labels(labels)} {value.sum:.6f}")
+                    lines.append(f"{full}_count{format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, jsonl_path, prom_path):
+        with open(jsonl_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, prom_path)
+
+    def start_exporter(self, jsonl_path, prom_path, interval=10.0):
+        def run():
+            while not self.stop.wait(interval):
+                self.export(jsonl_path, prom_path)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def close(self, jsonl_path, prom_path):
+        self.stop.set()
+        self.export(jsonl_path, prom_path)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+# === Cached Text Layout ===
+# Word-wrapping and FONT.render are the expensive part of drawing text, and
+# almost everything on screen is the same from one frame to the next. Layouts
+# are cached by (text, color, max_width, line_spacing) as ready-to-blit
+# surfaces with their y offsets, and evicted least recently used.
+class TextLayoutCache:
+    def __init__(self, font, max_entries=256):
+        self.font = font
+        self.max_entries = max_entries
+        self.layouts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def layout(self, text, color, max_width=None, line_spacing=0):
+        key = (text, color, max_width, line_spacing)
+        cached = self.layouts.get(key)
+        if cached is not None:
+            self.layouts.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        lines = self.wrap(text, max_width) if max_width is not None else [text]
+        cached = [(self.font.render(line, True, color), i * line_spacing) for i, line in enumerate(lines)]
+        self.layouts[key] = cached
+        if len(self.layouts) > self.max_entries:
+            self.layouts.popitem(last=False)
+        return cached
+
+    def wrap(self, text, max_width):
+        words = text.split(' ')
+        lines = []
+        line = ""
+        for word in words:
+            test_line = line + word + " "
+            if self.font.size(test_line)[0] < max_width:
+                line = test_line
+            else:
+                lines.append(line.strip())
+                line = word + " "
+        lines.append(line.strip())
+        return lines
+
+    def clear(self):
+        self.layouts.clear()
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from image_cache import generate_image, image_key
+
+# === Batch Generation ===
+# One image per prompt in a prompts file, `concurrency` at a time. Each
+# image is streamed to disk in chunks (into a .part file, renamed once
+# complete) and then recorded in manifest.jsonl in the output folder, one
+# JSON line per image. A rerun skips every prompt already in the manifest
+# whose file is still there, so an interrupted batch carries on where it
+# stopped. With b64=True (or an image already in the cache) the PNG comes
+# inside the generation response instead and is written out directly.
+
+CHUNK_SIZE = 64 * 1024
+MANIFEST = "manifest.jsonl"
+
+def read_prompts(path):
+    # One prompt per line; blank lines, # comments and repeats are skipped
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+class Manifest:
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST)
+        self.done = {}  # key -> entry
+        self.lock = threading.Lock()
+        self.needs_newline = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return
+        # An interrupted run can leave a cut-off last line; it is skipped,
+        # and the next entry starts on a line of its own
+        self.needs_newline = bool(text) and not text.endswith("\n")
+        for line in text.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if os.path.exists(os.path.join(folder, entry["file"])):
+                self.done[entry["key"]] = entry
+
+    def add(self, entry):
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                if self.needs_newline:
+                    f.write("\n")
+                    self.needs_newline = False
+                f.write(json.dumps(entry) + "\n")
+            self.done[entry["key"]] = entry
+
+# One connection pool per worker thread, reused for all its downloads
+local = threading.local()
+
+def session():
+    if not hasattr(local, "session"):
+        local.session = requests.Session()
+    return local.session
+
+def download(url, path, timeout=60):
+    # Streams url into path without holding the image in memory; returns its size
+    part_path = path + ".part"
+    size = 0
+    with session().get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+    os.replace(part_path, path)
+    return size
+
+def write_file(path, data):
+    part_path = path + ".part"
+    with open(part_path, "wb") as f:
+        f.write(data)
+    os.replace(part_path, path)
+
+def generate_one(client, prompt, folder, model, quality, size, b64=False, cache=None):
+    started = time.perf_counter()
+    key = image_key(prompt, model, quality, size)
+    file_name = key + ".png"
+    path = os.path.join(folder, file_name)
+    revised_prompt = None
+    if b64 or (cache is not None and cache.has(key)):
+        data = generate_image(client, prompt, model, quality, size, cache)
+        generated = time.perf_counter()
+        write_file(path, data)
+        nbytes = len(data)
+    else:
+        response = client.images.generate(model=model, prompt=prompt, quality=quality, size=size, n=1)
+        generated = time.perf_counter()
+        nbytes = download(response.data[0].url, path)
+        revised_prompt = getattr(response.data[0], "revised_prompt", None)
+        if cache is not None:
+            cache.put_file(key, path)
+    return {
+        "key": key,
+        "prompt": prompt,
+        "model": model,
+        "quality": quality,
+        "size": size,
+        "file": file_name,
+        "bytes": nbytes,
+        "generate_seconds": round(generated - started, 3),
+        "download_seconds": round(time.perf_counter() - generated, 3),
+        "revised_prompt": revised_prompt,
+    }
+
+def run_batch(client, prompts_path, folder, concurrency=4, model="dall-e-3", quality="hd", size="1024x1024",
+              b64=False, cache=None):
+    # Returns how many prompts failed (they are retried by the next run)
+    os.makedirs(folder, exist_ok=True)
+    manifest = Manifest(folder)
+    prompts = read_prompts(prompts_path)
+    todo = [prompt for prompt in prompts if image_key(prompt, model, quality, size) not in manifest.done]
+    print(f"{len(prompts) - len(todo)} of {len(prompts)} prompts already done; "
+          f"generating {len(todo)}, {concurrency} at a time")
+
+    started = time.perf_counter()
+    done = failed = total_bytes = 0
+    download_seconds = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="image") as pool:
+        try:
+            futures = {pool.submit(generate_one, client, prompt, folder, model, quality, size, b64, cache): prompt
+                       for prompt in todo}
+            for future in as_completed(futures):
+                prompt = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{done + failed}/{len(todo)}] failed: {prompt!r}: {e}")
+                    continue
+                manifest.add(entry)
+                done += 1
+                total_bytes += entry["bytes"]
+                download_seconds += entry["download_seconds"]
+                print(f"[{done + failed}/{len(todo)}] {entry['file']} ({entry['bytes'] / 1024:.0f} KiB, "
+                      f"{entry['generate_seconds']:.1f}s + {entry['download_seconds']:.1f}s): {prompt}")
+        except KeyboardInterrupt:
+            print("Interrupted; finished images are in the manifest")
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)  # don't start the rest on the way out
+            raise
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(f"Done: {done} images, {failed} failed in {elapsed:.1f}s | "
+          f"{done / elapsed * 60:.1f} images/min | {total_bytes / elapsed / 1024:.0f} KiB/s overall, "
+          f"{total_bytes / max(download_seconds, 1e-9) / 1024:.0f} KiB/s per download")
+    return failed
@@ -0,0 +1,90 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import threading
+
+# === Image Cache ===
+# Generated images on disk, content-addressed by a hash of the prompt, model,
+# quality and size (folder/ab/abcd....png), so asking for the same image again
+# costs neither an API call nor a download. Writes go through a tmp file and
+# os.replace, so a half-written image is never served.
+#
+# Images are requested as b64_json: the PNG arrives inside the generation
+# response, so there is no second HTTP round trip to fetch a URL. The bytes
+# are decoded once and handed to PIL or pygame through a BytesIO, which
+# wraps them without another copy.
+
+def image_key(prompt, model, quality, size):
+    return hashlib.sha256(f"{model}\n{quality}\n{size}\n{prompt}".encode("utf-8")).hexdigest()[:24]
+
+class ImageCache:
+    def __init__(self, folder):
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], key + ".png")
+
+    def has(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        try:
+            with open(self.path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            data = None
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put_file(self, key, source):
+        # For images that were streamed to disk rather than held in memory
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+def generate_image(client, prompt, model, quality, size="1024x1024", cache=None):
+    # PNG bytes for prompt: from the cache, else from one b64_json request
+    key = image_key(prompt, model, quality, size)
+    data = cache.get(key) if cache is not None else None
+    if data is None:
+        response = client.images.generate(
+            model=model, prompt=prompt, quality=quality, size=size, n=1, response_format="b64_json"
+        )
+        data = base64.b64decode(response.data[0].b64_json)
+        if cache is not None:
+            cache.put(key, data)
+    return data
+
+def to_pil(data):
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+def to_surface(data):
+    # For showing images in a pygame window
+    import pygame
+    return pygame.image.load(io.BytesIO(data), "image.png")
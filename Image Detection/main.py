@@ -1,27 +1,60 @@
 from openai import OpenAI
 import os
+import sys
+import argparse
 from dotenv import load_dotenv
-from PIL import Image
-from io import BytesIO
-import requests
 
 load_dotenv()
 key = os.getenv('api_key')
 
-client = OpenAI(api_key=key)
+client = OpenAI(api_key=key, base_url=os.getenv('api_base_url') or None)
 
+parser = argparse.ArgumentParser(description="Generate images with DALL-E.")
+parser.add_argument("--batch", metavar="PROMPTS", help="file with one prompt per line to generate in bulk")
+parser.add_argument("--out", default="images", help="output folder for --batch (holds manifest.jsonl)")
+parser.add_argument("--concurrency", type=int, default=4, help="images generated at once in --batch")
+parser.add_argument("--model", default="dall-e-3")
+parser.add_argument("--quality", default="hd")
+parser.add_argument("--size", default="1024x1024")
+parser.add_argument("--b64", action="store_true", help="get images inside the response (b64_json) instead of from a URL")
+parser.add_argument("--cache", default="image_cache", help="folder of cached images, by prompt, model, quality and size")
+parser.add_argument("--no-cache", action="store_true")
+args = parser.parse_args()
 
+from image_cache import ImageCache, generate_image, image_key, to_pil
+cache = None if args.no_cache else ImageCache(args.cache)
 
-response = client.images.generate(
-        model="dall-e-3",
-        prompt="Image of a dolphin",
-        quality="hd",
-        n=1,
-)
- 
-img = response.data[0].url
-print(img)
+if args.batch:
+    from batch import run_batch
+    failed = run_batch(client, args.batch, args.out, args.concurrency, args.model, args.quality, args.size,
+                       b64=args.b64, cache=cache)
+    if cache is not None:
+        print("Image cache:", cache.stats())
+    sys.exit(1 if failed else 0)
 
-response = requests.get(response.data[0].url)
-image = Image.open(BytesIO(response.content))
-image.show()
\ No newline at end of file
+prompt = "Image of a dolphin"
+key = image_key(prompt, args.model, args.quality, args.size)
+if args.b64 or (cache is not None and cache.has(key)):
+    image = to_pil(generate_image(client, prompt, args.model, args.quality, args.size, cache))
+else:
+    from PIL import Image
+    from io import BytesIO
+    import requests
+
+    response = client.images.generate(
+            model=args.model,
+            prompt=prompt,
+            quality=args.quality,
+            size=args.size,
+            n=1,
+    )
+
+    img = response.data[0].url
+    print(img)
+
+    response = requests.get(response.data[0].url)
+    response.raise_for_status()  # never cache an error page as the image
+    if cache is not None:
+        cache.put(key, response.content)
+    image = Image.open(BytesIO(response.content))
+image.show()